@@ -0,0 +1,92 @@
+# auth_pool.py
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+# Hash/verify calls allowed to wait or run at once; beyond this callers get AuthBusyError.
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class AuthBusyError(Exception):
+    """Raised when the password-hashing queue is full."""
+
+
+class HashPool:
+    """Runs bcrypt on a small dedicated thread pool with a bounded queue.
+
+    bcrypt releases the GIL, so the workers hash in parallel while the event
+    loop keeps serving other endpoints.
+    """
+
+    def __init__(self, workers: int = AUTH_HASH_WORKERS, max_pending: int = AUTH_MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            op: {"count": 0, "rejected": 0, "compute_seconds_total": 0.0, "compute_seconds_max": 0.0,
+                 "latency_seconds_total": 0.0, "latency_seconds_max": 0.0}
+            for op in ("hash", "verify")
+        }
+
+    def _timed(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.stats[op]
+                stats["compute_seconds_total"] += elapsed
+                stats["compute_seconds_max"] = max(stats["compute_seconds_max"], elapsed)
+
+    async def _run(self, op, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.stats[op]["rejected"] += 1
+                raise AuthBusyError(f"Password {op} queue is full")
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._timed, op, fn, *args)
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.pending -= 1
+                stats = self.stats[op]
+                stats["count"] += 1
+                stats["latency_seconds_total"] += latency
+                stats["latency_seconds_max"] = max(stats["latency_seconds_max"], latency)
+
+    async def hash_password(self, password: str) -> str:
+        return await self._run("hash", lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS)).decode())
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        return await self._run("verify", bcrypt.checkpw, password.encode(), hashed.encode())
+
+    def snapshot(self):
+        with self._lock:
+            ops = {}
+            for op, s in self.stats.items():
+                n = s["count"]
+                ops[op] = {
+                    "count": n,
+                    "rejected": s["rejected"],
+                    "compute_avg_ms": round(1000 * s["compute_seconds_total"] / n, 3) if n else 0.0,
+                    "compute_max_ms": round(1000 * s["compute_seconds_max"], 3),
+                    "latency_avg_ms": round(1000 * s["latency_seconds_total"] / n, 3) if n else 0.0,
+                    "latency_max_ms": round(1000 * s["latency_seconds_max"], 3),
+                }
+            return {"workers": self.workers, "max_pending": self.max_pending, "pending": self.pending,
+                    "bcrypt_rounds": BCRYPT_ROUNDS, **ops}
+
+
+hash_pool = HashPool()
@@ -0,0 +1,241 @@
+# benchmark.py
+#
+# Scaled benchmark of the recommendation pipeline. Synthesizes catalogs from
+# models/movies.csv and models/ratings.csv, times every stage and records the
+# peak RSS while it runs.
+#
+#   python benchmark.py                                   # 10k / 50k / 200k movies
+#   python benchmark.py --movies 10000 --ratings 1000000 --output bench.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cine_stellation_recommender import CineStellationRecommender
+
+DEFAULT_MOVIES = [10_000, 50_000, 200_000]
+DEFAULT_RATINGS = [1_000_000, 5_000_000, 20_000_000]
+CSV_CHUNK_ROWS = 1_000_000
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        # ru_maxrss is a lifetime peak (KiB on Linux, bytes on macOS); better than nothing.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == "Darwin" else peak * 1024
+
+
+class PeakRSS:
+    """Sample RSS on a background thread and keep the maximum seen."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start_bytes = self.peak_bytes = current_rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+        return False
+
+
+def run_stage(results: dict, name: str, fn, *args, **kwargs):
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(rss.peak_bytes / 2 ** 20, 1),
+        "rss_growth_mb": round((rss.peak_bytes - rss.start_bytes) / 2 ** 20, 1),
+    }
+    print(f"  {name:<32} {seconds:9.3f}s  peak RSS {results[name]['peak_rss_mb']:.0f} MB")
+    return value
+
+
+def synthesize_dataset(base_movies: pd.DataFrame, base_ratings: pd.DataFrame, n_movies: int, n_ratings: int,
+                       out_dir: str, seed: int = 0):
+    """Upsample the base catalog to ``n_movies`` titles and ``n_ratings`` ratings.
+
+    Extra titles reuse a base title's genres and year but get two words drawn
+    from the base vocabulary, so TF-IDF neighbourhoods stay realistic rather
+    than collapsing into exact duplicates.
+    """
+    rng = np.random.default_rng(seed)
+    source = rng.integers(0, len(base_movies), size=n_movies)
+    source[:min(n_movies, len(base_movies))] = np.arange(min(n_movies, len(base_movies)))
+    titles = base_movies["title"].to_numpy()[source].astype(object)
+    genres = base_movies["genres"].to_numpy()[source]
+
+    vocabulary = np.array(sorted({w for t in base_movies["title"] for w in t.split() if w.isalpha()}))
+    extra = np.arange(n_movies) >= len(base_movies)
+    if extra.any():
+        words = vocabulary[rng.integers(0, len(vocabulary), size=(int(extra.sum()), 2))]
+        base_titles = pd.Series(titles[extra])
+        stem = base_titles.str.replace(r"\s*\(\d{4}\)\s*$", "", regex=True)
+        year = base_titles.str.extract(r"(\(\d{4}\))\s*$")[0].fillna("")
+        titles[extra] = (stem + " " + words[:, 0] + " " + words[:, 1] + " " + year).str.strip().to_numpy()
+
+    movies = pd.DataFrame({"movieId": np.arange(1, n_movies + 1, dtype=np.int64), "title": titles, "genres": genres})
+    movies_path = os.path.join(out_dir, f"movies_{n_movies}.csv")
+    movies.to_csv(movies_path, index=False)
+
+    # Popularity follows the base per-movie rating counts; values follow the base rating histogram.
+    counts = base_ratings["movieId"].value_counts().to_numpy(dtype=np.float64)
+    popularity = rng.choice(counts, size=n_movies)
+    popularity /= popularity.sum()
+    values, freq = np.unique(base_ratings["rating"].to_numpy(), return_counts=True)
+    n_users = max(1000, n_ratings // 100)
+
+    ratings_path = os.path.join(out_dir, f"ratings_{n_movies}_{n_ratings}.csv")
+    written = 0
+    with open(ratings_path, "w") as f:
+        f.write("userId,movieId,rating,timestamp\n")
+        while written < n_ratings:
+            rows = min(CSV_CHUNK_ROWS, n_ratings - written)
+            chunk = pd.DataFrame({
+                "userId": rng.integers(1, n_users + 1, size=rows, dtype=np.int32),
+                "movieId": rng.choice(n_movies, size=rows, p=popularity).astype(np.int32) + 1,
+                "rating": rng.choice(values, size=rows, p=freq / freq.sum()),
+                "timestamp": rng.integers(828_000_000, 1_540_000_000, size=rows, dtype=np.int64),
+            })
+            chunk.to_csv(f, header=False, index=False)
+            written += rows
+    return movies_path, ratings_path
+
+
+def mongo_stand_in():
+    """A mongomock collection when available, else a plain in-memory list with the same calls."""
+    try:
+        import mongomock
+        return mongomock.MongoClient()["cine_db"]["similarities"], "mongomock"
+    except ImportError:
+        class ListCollection:
+            def __init__(self):
+                self.docs = []
+
+            def insert_many(self, docs):
+                self.docs.extend(dict(d) for d in docs)
+
+            def find(self):
+                return iter(self.docs)
+
+        return ListCollection(), "in-memory"
+
+
+def recommend_qps(recommender, seconds: float, top_n: int = 10, seed: int = 0):
+    movie_ids = recommender.movie_columns["movieId"]
+    picks = np.random.default_rng(seed).choice(movie_ids, size=10_000).tolist()
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for i in range(calls, calls + 1000):
+            recommender.recommend_similar_movies(picks[i % len(picks)], top_n)
+        calls += 1000
+    elapsed = time.perf_counter() - start
+    return {"calls": calls, "qps": round(calls / elapsed, 1), "mean_us": round(1e6 * elapsed / calls, 2)}
+
+
+def benchmark_size(n_movies: int, n_ratings: int, base_movies, base_ratings, args):
+    print(f"== {n_movies} movies, {n_ratings} ratings")
+    stages = {}
+    with tempfile.TemporaryDirectory(prefix="cine-bench-", dir=args.workdir) as out_dir:
+        movies_path, ratings_path = run_stage(stages, "synthesize", synthesize_dataset, base_movies, base_ratings,
+                                              n_movies, n_ratings, out_dir, args.seed)
+        recommender = run_stage(stages, "preprocess_data", CineStellationRecommender, ratings_path, movies_path)
+        run_stage(stages, "compute_similarity", recommender.compute_similarity, top_k=args.top_k)
+        docs = run_stage(stages, "serialize_similarity_matrix", recommender.serialize_similarity_matrix)
+
+        collection, backend = mongo_stand_in()
+        collection.insert_many(docs)
+        del docs
+
+        def load_from_store():
+            recommender.load_similarity_from_mongo(list(collection.find()))
+        run_stage(stages, "load_similarity_from_mongo", load_from_store)
+        del collection
+
+        run_stage(stages, "create_genre_constellations", recommender.create_genre_constellations,
+                  args.min_ratings, args.similarity_threshold, args.max_connections)
+        qps = run_stage(stages, "recommend_similar_movies", recommend_qps, recommender, args.qps_seconds)
+        stages["recommend_similar_movies"].update(qps)
+        print(f"  recommend_similar_movies: {qps['qps']} qps ({qps['mean_us']} us/call)")
+
+    return {"movies": n_movies, "ratings": n_ratings, "store_backend": backend, "stages": stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline at scaled dataset sizes")
+    parser.add_argument("--movies", type=int, nargs="+", default=DEFAULT_MOVIES)
+    parser.add_argument("--ratings", type=int, nargs="+", default=None,
+                        help="ratings per size (default: 1M / 5M / 20M, or 100 per movie)")
+    parser.add_argument("--base-movies", default="models/movies.csv")
+    parser.add_argument("--base-ratings", default="models/ratings.csv")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--min-ratings", type=int, default=20)
+    parser.add_argument("--similarity-threshold", type=float, default=0.2)
+    parser.add_argument("--max-connections", type=int, default=5)
+    parser.add_argument("--qps-seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="where synthetic CSVs are written (default: system temp)")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    if args.ratings is None:
+        defaults = dict(zip(DEFAULT_MOVIES, DEFAULT_RATINGS))
+        args.ratings = [defaults.get(n, n * 100) for n in args.movies]
+    if len(args.ratings) != len(args.movies):
+        parser.error("--ratings needs one value per --movies value")
+
+    base_movies = pd.read_csv(args.base_movies)
+    base_ratings = pd.read_csv(args.base_ratings, usecols=["movieId", "rating"])
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "workdir")},
+        "runs": [],
+    }
+    for n_movies, n_ratings in zip(args.movies, args.ratings):
+        report["runs"].append(benchmark_size(n_movies, n_ratings, base_movies, base_ratings, args))
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,129 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import networkx as nx
+import copy
 import json
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ingest import read_movies, ingest_ratings
+from metrics import timed
+
+
+def build_genre_edges(similarity, rows, similarity_threshold, max_connections):
+    """Pick each movie's strongest in-genre links from the neighbour table.
+
+    ``rows`` are positions into ``similarity``. Returns ``(src, dst, weights)``
+    where ``src``/``dst`` index into ``rows``.
+    """
+    sub = similarity[rows][:, rows].tocsr()
+    counts = np.diff(sub.indptr)
+    row_of = np.repeat(np.arange(len(rows)), counts)
+    keep = sub.data >= similarity_threshold
+    src, dst, weights = row_of[keep], sub.indices[keep], sub.data[keep]
+    # Rank within each row by descending score and keep the first max_connections.
+    order = np.lexsort((-weights, src))
+    src, dst, weights = src[order], dst[order], weights[order]
+    starts = np.searchsorted(src, src, side='left')
+    rank = np.arange(len(src)) - starts
+    keep = rank < max_connections
+    return src[keep], dst[keep], weights[keep]
+
+
+def top_k_neighbors(queries, features, k, max_block_elems=2 ** 25, self_offset=None):
+    """Best ``k`` cosine neighbours in ``features`` for each row of ``queries``.
+
+    Both matrices must hold L2-normalised rows. Query row ``r`` is treated as
+    ``features`` row ``self_offset + r`` and excluded from its own neighbours.
+    Returns flat ``(indices, scores, counts)``, each row sorted best-first with
+    non-positive scores dropped.
+    """
+    m, n = queries.shape[0], features.shape[0]
+    k = max(0, min(k, n - (1 if self_offset is not None else 0)))
+    block_size = max(1, max_block_elems // max(n, 1))
+    features_t = features.T.tocsc()
+
+    counts = np.zeros(m, dtype=np.int64)
+    all_indices = []
+    all_scores = []
+    for start in range(0, m, block_size):
+        stop = min(start + block_size, m)
+        block = (queries[start:stop] @ features_t).toarray()
+        if self_offset is not None:
+            rows = np.arange(stop - start)
+            block[rows, rows + start + self_offset] = -np.inf
+        if k == 0:
+            top = np.empty((stop - start, 0), dtype=np.int64)
+        else:
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        keep = scores > 0
+        counts[start:stop] = keep.sum(axis=1)
+        all_indices.append(top[keep].astype(np.int32))
+        all_scores.append(scores[keep].astype(np.float32))
+
+    indices = np.concatenate(all_indices) if all_indices else np.empty(0, dtype=np.int32)
+    scores = np.concatenate(all_scores) if all_scores else np.empty(0, dtype=np.float32)
+    return indices, scores, counts
+
+
+# Below this many genre rows in total the serial path wins over the process pool.
+PARALLEL_MIN_GENRE_ROWS = int(os.getenv("CONSTELLATION_PARALLEL_MIN_ROWS", "50000"))
+# Requests asking for more constellation workers than this are clamped.
+MAX_GENRE_WORKERS = int(os.getenv("CONSTELLATION_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+# Long-lived constellation pool, reused across builds so workers only pay the
+# interpreter start and imports once.
+_genre_pool = None
+_genre_pool_workers = 0
+
+# Neighbour table memory-mapped by each worker process, cached per table dir.
+_worker_table_dir = None
+_worker_similarity = None
+
+
+def _genre_edges_task(table_dir, shape, genre, rows, similarity_threshold, max_connections):
+    global _worker_table_dir, _worker_similarity
+    if _worker_table_dir != table_dir:
+        arrays = [np.load(os.path.join(table_dir, f"{name}.npy"), mmap_mode='r')
+                  for name in ('data', 'indices', 'indptr')]
+        _worker_similarity = sparse.csr_matrix(tuple(arrays), shape=shape, copy=False)
+        _worker_table_dir = table_dir
+    return genre, build_genre_edges(_worker_similarity, rows, similarity_threshold, max_connections)
+
+
+def genre_pool(workers):
+    """Return the shared constellation pool with at least ``workers`` processes.
+
+    ``workers`` is clamped to ``MAX_GENRE_WORKERS``. The pool only ever grows,
+    so builds asking for different counts don't tear it down and respawn it.
+    """
+    global _genre_pool, _genre_pool_workers
+    workers = max(1, min(workers, MAX_GENRE_WORKERS))
+    if _genre_pool is None or _genre_pool_workers < workers:
+        shutdown_genre_pool()
+        # spawn rather than fork: the API process runs an event loop and threads.
+        _genre_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _genre_pool_workers = workers
+    return _genre_pool
+
+
+def shutdown_genre_pool():
+    global _genre_pool, _genre_pool_workers
+    if _genre_pool is not None:
+        _genre_pool.shutdown(wait=True, cancel_futures=True)
+    _genre_pool, _genre_pool_workers = None, 0
+
 
 class CineStellationRecommender:
-    def __init__(self, ratings_file=None, movies_file=None, dataframe_mode=False):
+    def __init__(self, ratings_file=None, movies_file=None, dataframe_mode=False, keep_ratings=False):
         self.similarity_matrix = None
         self.movie_features = None
         self.genre_networks = {}
@@ -16,110 +133,459 @@ class CineStellationRecommender:
         self.movies_with_ratings = None
         self.movie_ratings = None
         self.tfidf = None
+        self.movie_index = {}
+        self.movie_columns = {}
+        self.neighbor_k = None
+        self.ingest_stats = None
+        self.rating_prior_count = None
+        # sum/count per movieId of ratings folded in after the base aggregates were built.
+        self.rating_deltas = None
+        # Artifact build this model was saved as or loaded from (see model_store).
+        self.build_id = None
 
         if not dataframe_mode:
-            self.ratings_df = pd.read_csv(ratings_file)
-            self.movies_df = pd.read_csv(movies_file)
+            self.movies_df = read_movies(movies_file)
+            # Only the per-movie aggregates are needed; raw rows are streamed to Mongo from the file.
+            self.ratings_df, self.movie_ratings, self.ingest_stats = ingest_ratings(ratings_file, keep_ratings=keep_ratings)
             self.preprocess_data()
 
+    def clone(self):
+        """Shallow copy for rebuilding a model while this one keeps serving.
+
+        Rebuild steps replace attributes rather than mutating them, so sharing
+        the frames and arrays is safe; only the genre graph dict is copied.
+        """
+        other = copy.copy(self)
+        other.genre_networks = dict(self.genre_networks)
+        return other
+
     def set_dataframes(self, ratings_df, movies_df):
         self.ratings_df = ratings_df
         self.movies_df = movies_df
 
+    @staticmethod
+    def _with_content(movies_df):
+        genres = movies_df['genres']
+        # Strings from CSV are split; lists (e.g. loaded back from Mongo) come out as NaN and are kept.
+        split = genres.str.split('|')
+        movies_df['genres'] = split.where(split.notna(), genres)
+        movies_df['content'] = movies_df['title'] + ' ' + movies_df['genres'].str.join(' ')
+        movies_df['content'] = movies_df['content'].where(movies_df['genres'].str.len() > 0, movies_df['title'])
+        return movies_df
+
     def build_genre_lists(self):
-        self.movies_df['genres'] = self.movies_df['genres'].apply(lambda g: g if isinstance(g, list) else g.split('|'))
-        self.movies_df['content'] = self.movies_df.apply(lambda x: ' '.join([x['title']] + x['genres']), axis=1)
-        self.movie_ratings = self.ratings_df.groupby('movieId')['rating'].agg(['mean', 'count'])
+        self._with_content(self.movies_df)
+        if self.movie_ratings is None:
+            self.movie_ratings = self.ratings_df.groupby('movieId')['rating'].agg(['mean', 'count'])
         self.movies_with_ratings = self.movies_df.merge(self.movie_ratings, left_on='movieId', right_index=True, how='left').fillna(0)
+        self.build_movie_index()
+
+    def build_movie_index(self):
+        """Map movieId -> row position and cache the columns served by recommendations.
+
+        Must be called again whenever ``movies_with_ratings`` is replaced.
+        """
+        self.movies_with_ratings = self.movies_with_ratings.reset_index(drop=True)
+        movie_ids = self.movies_with_ratings['movieId'].to_numpy()
+        self.movie_index = {int(mid): idx for idx, mid in enumerate(movie_ids)}
+        self.movie_columns = {
+            'movieId': movie_ids.astype(np.int64),
+            'title': self.movies_with_ratings['title'].astype(str).to_numpy(),
+            'mean': self.movies_with_ratings['mean'].to_numpy(dtype=np.float64),
+            'count': self.movies_with_ratings['count'].to_numpy(dtype=np.float64),
+            'genres': self.movies_with_ratings['genres'].to_numpy(),
+            'year': self._extract_years(self.movies_with_ratings['title']),
+        }
+        self.movie_columns.update(self._scoring_priors(self.movie_columns))
+
+    def _scoring_priors(self, cols):
+        """Per-movie [0, 1] priors used by recommend_hybrid.
+
+        ``bayes_rating`` shrinks each mean toward the global mean by
+        ``rating_prior_count`` pseudo-ratings (default: median count of rated
+        movies), so a single 5-star rating doesn't outrank a well-rated classic.
+        """
+        mean, count, year = cols['mean'], cols['count'], cols['year']
+        rated = count > 0
+        if rated.any():
+            global_mean = float((mean * count).sum() / count.sum())
+            prior_count = self.rating_prior_count or float(np.median(count[rated]))
+        else:
+            global_mean, prior_count = 0.0, 1.0
+        bayes = (mean * count + global_mean * prior_count) / (count + prior_count)
+        popularity = np.log1p(count)
+        known_year = ~np.isnan(year)
+        recency = np.zeros(len(year))
+        if known_year.any():
+            lo, hi = np.nanmin(year), np.nanmax(year)
+            recency[known_year] = (year[known_year] - lo) / (hi - lo) if hi > lo else 1.0
+
+        def unit(values):
+            span = values.max() - values.min() if len(values) else 0
+            return ((values - values.min()) / span if span > 0 else np.zeros(len(values))).astype(np.float32)
+
+        return {'bayes_rating': unit(bayes), 'popularity': unit(popularity), 'recency': recency.astype(np.float32)}
+
+    def add_ratings(self, new_ratings):
+        """Fold a batch of new ratings into the per-movie mean/count aggregates.
+
+        Only the movies in the batch are touched. Updated arrays are built aside
+        and swapped in, so concurrent readers never see a half-applied batch.
+        Returns the number of ratings applied (unknown movies are skipped).
+        """
+        known = new_ratings['movieId'].isin(self.movie_index.keys())
+        batch = new_ratings[known].groupby('movieId')['rating'].agg(['sum', 'count'])
+        if batch.empty:
+            return 0
+        self._fold_ratings(batch)
+        return int(known.sum())
+
+    def apply_rating_totals(self, totals):
+        """Catch up with cumulative per-movie rating deltas (``sum``/``count`` by movieId).
+
+        Only the part of ``totals`` this model has not folded in yet is applied,
+        so replaying the same totals twice is a no-op. Returns the number of
+        ratings applied.
+        """
+        if totals is None or totals.empty:
+            return 0
+        totals = totals[totals.index.isin(self.movie_index.keys())][['sum', 'count']].astype(np.float64)
+        if self.rating_deltas is not None:
+            totals = totals - self.rating_deltas.reindex(totals.index, fill_value=0)
+        pending = totals[totals['count'] > 0]
+        if pending.empty:
+            return 0
+        self._fold_ratings(pending)
+        return int(pending['count'].sum())
+
+    def _fold_ratings(self, batch):
+        previous = self.movie_ratings.reindex(batch.index, fill_value=0)
+        counts = previous['count'].to_numpy(dtype=np.float64) + batch['count'].to_numpy(dtype=np.float64)
+        means = (previous['mean'].to_numpy(dtype=np.float64) * previous['count'].to_numpy(dtype=np.float64)
+                 + batch['sum'].to_numpy(dtype=np.float64)) / counts
+
+        movie_ratings = self.movie_ratings.reindex(self.movie_ratings.index.union(batch.index))
+        movie_ratings.loc[batch.index, 'mean'] = means
+        movie_ratings.loc[batch.index, 'count'] = counts
+
+        rows = np.fromiter((self.movie_index[int(mid)] for mid in batch.index), dtype=np.int64, count=len(batch))
+        mean_col = self.movie_columns['mean'].copy()
+        count_col = self.movie_columns['count'].copy()
+        mean_col[rows] = means
+        count_col[rows] = counts
+
+        deltas = batch[['sum', 'count']].astype(np.float64)
+        if self.rating_deltas is not None:
+            deltas = self.rating_deltas.add(deltas, fill_value=0)
+
+        self.movie_ratings = movie_ratings
+        self.movies_with_ratings = self.movies_with_ratings.assign(mean=mean_col, count=count_col)
+        movie_columns = {**self.movie_columns, 'mean': mean_col, 'count': count_col}
+        movie_columns.update(self._scoring_priors(movie_columns))
+        self.movie_columns = movie_columns
+        self.rating_deltas = deltas
+
+    @staticmethod
+    def _extract_years(titles):
+        # Vectorised extract_year: NaN where the title has no trailing "(YYYY)".
+        years = titles.astype(str).str.strip().str[-5:-1]
+        return pd.to_numeric(years.where(years.str.isdigit()), errors='coerce').to_numpy(dtype=np.float64)
 
     def preprocess_data(self):
         self.build_genre_lists()
         self.id_to_title_map = dict(zip(self.movies_df['movieId'], self.movies_df['title']))
-        print(f"Processed {len(self.movies_df)} movies and {len(self.ratings_df)} ratings")
+        print(f"Processed {len(self.movies_df)} movies and {int(self.movie_ratings['count'].sum())} ratings")
+
+    @timed("recommender.compute_similarity")
+    def compute_similarity(self, top_k=50, max_block_elems=2 ** 25):
+        """Build a top-k neighbour table instead of the dense N x N matrix.
 
-    def compute_similarity(self):
-        self.tfidf = TfidfVectorizer(stop_words='english')
-        self.movie_features = self.tfidf.fit_transform(self.movies_with_ratings['content'])
-        self.similarity_matrix = cosine_similarity(self.movie_features)
-        print(f"Computed similarity matrix with shape {self.similarity_matrix.shape}")
+        TF-IDF rows are L2-normalised, so cosine similarity is a plain dot
+        product. Rows are processed in blocks sized so that a dense block never
+        exceeds ``max_block_elems`` floats, and only the best ``top_k`` scores
+        per movie are kept.
+        """
+        self.tfidf = TfidfVectorizer(stop_words='english', dtype=np.float32)
+        self.movie_features = self.tfidf.fit_transform(self.movies_with_ratings['content']).tocsr()
+        n = self.movie_features.shape[0]
+        indices, scores, counts = top_k_neighbors(self.movie_features, self.movie_features, top_k,
+                                                  max_block_elems, self_offset=0)
+        self.neighbor_k = top_k
+        self.similarity_matrix = self._neighbor_table(indices, scores, self._indptr(counts), n)
+        print(f"Computed top-{top_k} similarity table for {n} movies ({self.similarity_matrix.nnz} neighbours)")
 
-    def serialize_similarity_matrix(self, top_n=20):
+    @staticmethod
+    def _indptr(counts):
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr
+
+    @timed("recommender.add_movies")
+    def add_movies(self, new_movies, max_block_elems=2 ** 25):
+        """Add movies to a fitted model without refitting TF-IDF or redoing N x N work.
+
+        New titles are embedded with the existing vocabulary and matched against
+        the whole catalog. Existing movies whose neighbour lists a new title now
+        enters are patched. Returns the movieIds whose neighbour lists changed,
+        new movies included.
+        """
+        if self.tfidf is None or self.movie_features is None or self.similarity_matrix is None:
+            raise ValueError("add_movies needs a fitted TF-IDF model and similarity table")
+        new_movies = new_movies[~new_movies['movieId'].isin(self.movie_index.keys())]
+        new_movies = self._with_content(new_movies.drop_duplicates('movieId').reset_index(drop=True))
+        if new_movies.empty:
+            return []
+
+        old_table = self.similarity_matrix
+        n_old = old_table.shape[0]
+        k = self.neighbor_k or int(np.diff(old_table.indptr).max(initial=0))
+        new_features = self.tfidf.transform(new_movies['content']).astype(np.float32).tocsr()
+        features = sparse.vstack([self.movie_features, new_features], format='csr')
+        new_indices, new_scores, new_counts = top_k_neighbors(new_features, features, k, max_block_elems,
+                                                              self_offset=n_old)
+
+        # An existing movie takes a new title only if it beats the weakest kept neighbour.
+        old_rows = np.repeat(np.arange(n_old), np.diff(old_table.indptr))
+        row_len = np.diff(old_table.indptr)
+        weakest = np.full(n_old, -np.inf, dtype=np.float32)
+        full = row_len >= k
+        weakest[full] = old_table.data[old_table.indptr[1:][full] - 1] if k else np.inf
+        cross = (self.movie_features @ new_features.T).tocoo()
+        hit = (cross.data > 0) & (cross.data > weakest[cross.row])
+        cand_rows, cand_cols, cand_scores = cross.row[hit], cross.col[hit] + n_old, cross.data[hit]
+
+        rows = np.concatenate([old_rows, cand_rows, np.repeat(np.arange(n_old, features.shape[0]), new_counts)])
+        cols = np.concatenate([old_table.indices, cand_cols, new_indices]).astype(np.int32)
+        scores = np.concatenate([old_table.data, cand_scores, new_scores]).astype(np.float32)
+        order = np.lexsort((-scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+        keep = rank < k
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        counts = np.bincount(rows, minlength=features.shape[0])
+
+        rated = self.movie_ratings.reindex(new_movies['movieId'], fill_value=0)
+        new_with_ratings = new_movies.assign(mean=rated['mean'].to_numpy(), count=rated['count'].to_numpy())
+        self.movies_df = pd.concat([self.movies_df, new_movies], ignore_index=True)
+        self.movies_with_ratings = pd.concat([self.movies_with_ratings, new_with_ratings], ignore_index=True)
+        self.build_movie_index()
+        self.id_to_title_map = {**self.id_to_title_map, **dict(zip(new_movies['movieId'], new_movies['title']))}
+        self.movie_features = features
+        self.similarity_matrix = self._neighbor_table(cols, scores, self._indptr(counts), features.shape[0])
+
+        changed = np.union1d(np.unique(cand_rows), np.arange(n_old, features.shape[0]))
+        print(f"Added {len(new_movies)} movies; patched {len(changed) - len(new_movies)} existing neighbour lists")
+        return self.movie_columns['movieId'][changed].tolist()
+
+    @staticmethod
+    def _neighbor_table(indices, scores, indptr, n):
+        # Rows are stored in descending score order; keep it that way by building
+        # the CSR arrays directly rather than letting scipy sort them.
+        if indptr[-1] <= np.iinfo(np.int32).max:
+            indptr = indptr.astype(np.int32)
+        return sparse.csr_matrix((scores, indices, indptr), shape=(n, n))
+
+    def get_neighbors(self, idx):
+        """Return (row indices, scores) of a movie's neighbours, best first."""
+        start, stop = self.similarity_matrix.indptr[idx], self.similarity_matrix.indptr[idx + 1]
+        return self.similarity_matrix.indices[start:stop], self.similarity_matrix.data[start:stop]
+
+    @timed("recommender.serialize_similarity_matrix")
+    def serialize_similarity_matrix(self, top_n=20, only_movie_ids=None):
+        movie_ids = self.movie_columns['movieId']
+        if only_movie_ids is None:
+            rows = range(len(movie_ids))
+        else:
+            rows = [self.movie_index[int(mid)] for mid in only_movie_ids]
         result = []
-        for idx, row in self.movies_with_ratings.iterrows():
-            sims = list(enumerate(self.similarity_matrix[idx]))
-            sims = sorted(sims, key=lambda x: x[1], reverse=True)[1:top_n + 1]
-            entry = {
-                "movieId": int(row['movieId']),
-                "similarities": [{"movieId": int(self.movies_with_ratings.iloc[j]['movieId']), "score": float(score)}
-                                 for j, score in sims]
-            }
-            result.append(entry)
+        for idx in rows:
+            movie_id = movie_ids[idx]
+            neighbors, scores = self.get_neighbors(idx)
+            result.append({
+                "movieId": int(movie_id),
+                "similarities": [{"movieId": int(movie_ids[j]), "score": float(score)}
+                                 for j, score in zip(neighbors[:top_n], scores[:top_n])]
+            })
         return result
 
+    @timed("recommender.load_similarity_from_mongo")
     def load_similarity_from_mongo(self, similarity_data):
         size = len(self.movies_with_ratings)
-        matrix = np.zeros((size, size))
-        movie_index = {int(mid): idx for idx, mid in enumerate(self.movies_with_ratings['movieId'])}
+        movie_index = self.movie_index
+        rows = [[] for _ in range(size)]
         for doc in similarity_data:
             i = movie_index.get(doc['movieId'])
             if i is not None:
-                for entry in doc['similarities']:
-                    j = movie_index.get(entry['movieId'])
-                    if j is not None:
-                        matrix[i, j] = entry['score']
-        self.similarity_matrix = matrix
-        print("Loaded similarity matrix from MongoDB")
+                rows[i] = [(movie_index[entry['movieId']], entry['score'])
+                           for entry in doc['similarities'] if entry['movieId'] in movie_index]
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        scores = np.empty(indptr[-1], dtype=np.float32)
+        for i, row in enumerate(rows):
+            row.sort(key=lambda x: x[1], reverse=True)
+            for offset, (j, score) in enumerate(row):
+                indices[indptr[i] + offset] = j
+                scores[indptr[i] + offset] = score
+        self.similarity_matrix = self._neighbor_table(indices, scores, indptr, size)
+        print("Loaded similarity table from MongoDB")
 
+    @timed("recommender.recommend_similar_movies")
     def recommend_similar_movies(self, movie_id, top_n=5):
-        try:
-            movie_idx = self.movies_with_ratings[self.movies_with_ratings['movieId'] == movie_id].index[0]
-            sim_scores = list(enumerate(self.similarity_matrix[movie_idx]))
-            sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:top_n + 1]
-            movie_indices = [i[0] for i in sim_scores]
-            recommendations = []
-            for idx in movie_indices:
-                movie_row = self.movies_with_ratings.iloc[idx]
-                recommendations.append({
-                    'id': int(movie_row['movieId']),
-                    'title': str(movie_row['title']),
-                    'similarity': float(sim_scores[movie_indices.index(idx)][1]),
-                    'rating': float(movie_row['mean']),
-                    'genres': list(map(str, movie_row['genres']))
-                })
-            return recommendations
-        except Exception as e:
-            print(f"Error recommending similar movies: {e}")
+        movie_idx = self.movie_index.get(int(movie_id))
+        if movie_idx is None or self.similarity_matrix is None or top_n <= 0:
+            return []
+        # Neighbour rows are stored best-first, so the top-N is a prefix slice.
+        neighbors, scores = self.get_neighbors(movie_idx)
+        return self._movie_payloads(neighbors[:top_n], scores[:top_n])
+
+    @timed("recommender.recommend_hybrid")
+    def recommend_hybrid(self, movie_id, top_n=5, w_similarity=1.0, w_rating=0.0, w_popularity=0.0, w_recency=0.0):
+        """Rank a movie's neighbours by a weighted blend of similarity and precomputed priors.
+
+        Only the stored neighbour list is scored, so the cost is one top-k pass
+        over at most ``neighbor_k`` candidates regardless of catalog size.
+        """
+        movie_idx = self.movie_index.get(int(movie_id))
+        if movie_idx is None or self.similarity_matrix is None or top_n <= 0:
             return []
+        neighbors, similarity = self.get_neighbors(movie_idx)
+        cols = self.movie_columns
+        scores = (w_similarity * similarity
+                  + w_rating * cols['bayes_rating'][neighbors]
+                  + w_popularity * cols['popularity'][neighbors]
+                  + w_recency * cols['recency'][neighbors])
+        if len(scores) > top_n:
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return self._movie_payloads(neighbors[top], similarity[top], score=scores[top])
+
+    @timed("recommender.recommend_similar_movies_batch")
+    def recommend_similar_movies_batch(self, movie_ids, top_n=5):
+        """recommend_similar_movies for many movies with one gather over the neighbour table.
+
+        Returns ``{movie_id: recommendations}``; unknown ids map to ``[]``.
+        """
+        movie_ids = [int(m) for m in movie_ids]
+        known = [m for m in movie_ids if m in self.movie_index]
+        results = {m: [] for m in movie_ids}
+        if not known or self.similarity_matrix is None or top_n <= 0:
+            return results
+        rows = np.array([self.movie_index[m] for m in known], dtype=np.int64)
+        table = self.similarity_matrix
+        starts = table.indptr[rows].astype(np.int64)
+        lengths = np.minimum(table.indptr[rows + 1] - starts, top_n)
+        # Flat positions of the first `lengths[i]` entries of each requested row.
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        positions = offsets + np.arange(lengths.sum())
+        payloads = self._movie_payloads(table.indices[positions], table.data[positions])
+        bounds = np.concatenate(([0], np.cumsum(lengths)))
+        for i, movie_id in enumerate(known):
+            results[movie_id] = payloads[bounds[i]:bounds[i + 1]]
+        return results
 
-    def create_genre_constellations(self, min_ratings=50, similarity_threshold=0.3, max_connections=5):
-        popular_movies = self.movies_with_ratings[self.movies_with_ratings['count'] >= min_ratings]
-        all_genres = set(g for genres in self.movies_df['genres'] for g in genres)
-        for genre in all_genres:
-            if genre == '(no genres listed)':
-                continue
-            genre_movies = popular_movies[popular_movies['genres'].apply(lambda x: genre in x)]
-            if len(genre_movies) < 5:
-                continue
-            G = nx.Graph()
-            for idx, row in genre_movies.iterrows():
-                movie_id = row['movieId']
-                G.add_node(movie_id, title=row['title'], rating=row['mean'], count=row['count'], year=self.extract_year(row['title']))
-            for i, row_i in genre_movies.iterrows():
-                idx_i = self.movies_with_ratings[self.movies_with_ratings['movieId'] == row_i['movieId']].index[0]
-                similarities = []
-                for j, row_j in genre_movies.iterrows():
-                    if row_i['movieId'] == row_j['movieId']:
-                        continue
-                    idx_j = self.movies_with_ratings[self.movies_with_ratings['movieId'] == row_j['movieId']].index[0]
-                    sim_score = self.similarity_matrix[idx_i, idx_j]
-                    if sim_score >= similarity_threshold:
-                        similarities.append((row_j['movieId'], sim_score))
-                similarities.sort(key=lambda x: x[1], reverse=True)
-                for movie_j_id, sim_score in similarities[:max_connections]:
-                    G.add_edge(row_i['movieId'], movie_j_id, weight=sim_score)
+    @timed("recommender.recommend_for_movies")
+    def recommend_for_movies(self, movie_ids, top_n=10):
+        """Rank unseen movies by their summed similarity to all of ``movie_ids``.
+
+        Used for personalised recommendations from a watched list; the input
+        movies themselves are excluded.
+        """
+        rows = np.array([self.movie_index[int(m)] for m in movie_ids if int(m) in self.movie_index], dtype=np.int64)
+        if len(rows) == 0 or self.similarity_matrix is None or top_n <= 0:
+            return []
+        table = self.similarity_matrix[rows]
+        candidates, inverse = np.unique(table.indices, return_inverse=True)
+        totals = np.bincount(inverse, weights=table.data, minlength=len(candidates))
+        unseen = ~np.isin(candidates, rows)
+        candidates, totals = candidates[unseen], totals[unseen]
+        if len(candidates) > top_n:
+            top = np.argpartition(-totals, top_n - 1)[:top_n]
+            candidates, totals = candidates[top], totals[top]
+        order = np.argsort(-totals, kind='stable')
+        return self._movie_payloads(candidates[order], totals[order])
+
+    def _movie_payloads(self, rows, scores, **extra):
+        cols = self.movie_columns
+        payloads = [
+            {
+                'id': int(mid),
+                'title': str(title),
+                'similarity': float(score),
+                'rating': float(mean),
+                'genres': list(map(str, genres))
+            }
+            for mid, title, score, mean, genres in zip(
+                cols['movieId'][rows], cols['title'][rows], scores,
+                cols['mean'][rows], cols['genres'][rows])
+        ]
+        for name, values in extra.items():
+            for payload, value in zip(payloads, values.tolist()):
+                payload[name] = value
+        return payloads
+
+    def genre_row_groups(self, min_ratings=50):
+        """Return {genre: row positions} for movies with at least ``min_ratings`` ratings."""
+        popular = np.flatnonzero(self.movie_columns['count'] >= min_ratings)
+        exploded = pd.Series(self.movie_columns['genres'][popular], index=popular).explode()
+        exploded = exploded[exploded.notna() & (exploded != '(no genres listed)')]
+        return {genre: rows.to_numpy(dtype=np.int64)
+                for genre, rows in exploded.index.to_series().groupby(exploded.to_numpy(), sort=True)}
+
+    @timed("recommender.create_genre_constellations")
+    def create_genre_constellations(self, min_ratings=50, similarity_threshold=0.3, max_connections=5, workers=1):
+        """Build one similarity graph per genre into ``self.genre_networks``.
+
+        With ``workers > 1`` and at least ``PARALLEL_MIN_GENRE_ROWS`` genre rows
+        the genres are split across a shared process pool. The neighbour table
+        is written once to ``.npy`` files that every worker memory-maps, so it
+        is never pickled per task. Smaller builds run serially, since pool
+        overhead would dominate.
+        """
+        groups = {genre: rows for genre, rows in self.genre_row_groups(min_ratings).items() if len(rows) >= 5}
+        total_rows = sum(len(rows) for rows in groups.values())
+        if workers and workers > 1 and len(groups) > 1 and total_rows >= PARALLEL_MIN_GENRE_ROWS:
+            edges = self._genre_edges_parallel(groups, similarity_threshold, max_connections, workers)
+        else:
+            edges = ((genre, build_genre_edges(self.similarity_matrix, rows, similarity_threshold, max_connections))
+                     for genre, rows in groups.items())
+        for genre, (src, dst, weights) in edges:
+            G = self._genre_graph(groups[genre], src, dst, weights)
             self.genre_networks[genre] = G
             print(f"Created constellation for {genre} with {G.number_of_nodes()} movies and {G.number_of_edges()} connections")
 
+    def _genre_edges_parallel(self, groups, similarity_threshold, max_connections, workers):
+        similarity = self.similarity_matrix
+        with tempfile.TemporaryDirectory(prefix="cine-neighbors-") as table_dir:
+            for name in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(table_dir, f"{name}.npy"), getattr(similarity, name))
+            pool = genre_pool(workers)
+            # Largest genres first so one big genre doesn't finish last on its own.
+            ordered = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+            try:
+                futures = [pool.submit(_genre_edges_task, table_dir, similarity.shape, genre, rows,
+                                       similarity_threshold, max_connections)
+                           for genre, rows in ordered]
+                return [future.result() for future in futures]
+            except BrokenProcessPool:
+                shutdown_genre_pool()  # a worker died; start fresh next time
+                raise
+
+    def _genre_graph(self, rows, src, dst, weights):
+        cols = self.movie_columns
+        movie_ids = cols['movieId'][rows].tolist()
+        G = nx.Graph()
+        G.add_nodes_from(
+            (mid, {'title': title, 'rating': rating, 'count': count, 'year': None if np.isnan(year) else int(year)})
+            for mid, title, rating, count, year in zip(
+                movie_ids, cols['title'][rows], cols['mean'][rows].tolist(),
+                cols['count'][rows].tolist(), cols['year'][rows]))
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        G.add_weighted_edges_from(zip(ids[src].tolist(), ids[dst].tolist(), weights.tolist()))
+        return G
+
     def extract_year(self, title):
         try:
             year = title.strip()[-5:-1]
@@ -127,8 +593,31 @@ class CineStellationRecommender:
         except:
             return None
     
+    def _constellation_movie(self, movie_id, attrs):
+        return {
+            "id": int(movie_id),
+            "title": attrs["title"],
+            "rating": float(attrs["rating"]),
+            "ratingCount": int(attrs["count"]),
+            "year": attrs["year"],
+            "genres": [str(g) for g in self.movie_columns['genres'][self.movie_index[int(movie_id)]]]
+        }
+
+    def get_genre_constellation_data(self, genre):
+        """Movies and connections of a single genre network."""
+        G = self.genre_networks[genre]
+        return {
+            "name": genre,
+            "movieCount": G.number_of_nodes(),
+            "connectionCount": G.number_of_edges(),
+            "movies": [self._constellation_movie(movie_id, attrs) for movie_id, attrs in G.nodes(data=True)],
+            "connections": [
+                {"source": int(movie_i), "target": int(movie_j), "similarity": float(attrs["weight"]), "genre": genre}
+                for movie_i, movie_j, attrs in G.edges(data=True)
+            ]
+        }
+
     def get_constellation_data(self):
-        
         """Return constellation data as a dictionary for API serving"""
         constellation_data = {
             "genres": [],
@@ -138,66 +627,22 @@ class CineStellationRecommender:
 
         movie_ids_added = set()
 
-        for genre, G in self.genre_networks.items():
-            genre_info = {
+        for genre in self.genre_networks:
+            genre_data = self.get_genre_constellation_data(genre)
+            constellation_data["genres"].append({
                 "name": genre,
-                "movieCount": G.number_of_nodes(),
-                "connectionCount": G.number_of_edges()
-            }
-            constellation_data["genres"].append(genre_info)
-
-            for movie_id, attrs in G.nodes(data=True):
-                if movie_id not in movie_ids_added:
-                    movie_info = {
-                        "id": int(movie_id),
-                        "title": attrs["title"],
-                        "rating": float(attrs["rating"]),
-                        "ratingCount": int(attrs["count"]),
-                        "year": attrs["year"],
-                        "genres": [g for g in self.movies_df[self.movies_df["movieId"] == movie_id]["genres"].iloc[0]]
-                    }
+                "movieCount": genre_data["movieCount"],
+                "connectionCount": genre_data["connectionCount"]
+            })
+            for movie_info in genre_data["movies"]:
+                if movie_info["id"] not in movie_ids_added:
                     constellation_data["movies"].append(movie_info)
-                    movie_ids_added.add(movie_id)
-
-            for movie_i, movie_j, attrs in G.edges(data=True):
-                connection = {
-                    "source": int(movie_i),
-                    "target": int(movie_j),
-                    "similarity": float(attrs["weight"]),
-                    "genre": genre
-                }
-                constellation_data["connections"].append(connection)
+                    movie_ids_added.add(movie_info["id"])
+            constellation_data["connections"].extend(genre_data["connections"])
 
         return constellation_data
 
     def export_constellation_data(self, output_file="constellation_data.json"):
-        constellation_data = {"genres": [], "movies": [], "connections": []}
-        movie_ids_added = set()
-        for genre, G in self.genre_networks.items():
-            constellation_data["genres"].append({
-                "name": genre,
-                "movieCount": G.number_of_nodes(),
-                "connectionCount": G.number_of_edges()
-            })
-            for movie_id, attrs in G.nodes(data=True):
-                if movie_id not in movie_ids_added:
-                    movie_info = {
-                        "id": int(movie_id),
-                        "title": attrs["title"],
-                        "rating": float(attrs["rating"]),
-                        "ratingCount": int(attrs["count"]),
-                        "year": attrs["year"],
-                        "genres": [g for g in self.movies_df[self.movies_df["movieId"] == movie_id]["genres"].iloc[0]]
-                    }
-                    constellation_data["movies"].append(movie_info)
-                    movie_ids_added.add(movie_id)
-            for movie_i, movie_j, attrs in G.edges(data=True):
-                constellation_data["connections"].append({
-                    "source": int(movie_i),
-                    "target": int(movie_j),
-                    "similarity": float(attrs["weight"]),
-                    "genre": genre
-                })
         with open(output_file, 'w') as f:
-            json.dump(constellation_data, f, indent=2)
-        print(f"Exported constellation data to {output_file}")
\ No newline at end of file
+            json.dump(self.get_constellation_data(), f, indent=2)
+        print(f"Exported constellation data to {output_file}")
@@ -0,0 +1,70 @@
+# constellation_export.py
+
+import gzip
+import hashlib
+import json
+import time
+import uuid
+
+ALL_KEY = "all"
+# Stay well under Mongo's 16 MB document limit.
+PART_BYTES = 8 * 1024 * 1024
+
+
+def genre_key(genre: str) -> str:
+    return f"genre:{genre}"
+
+
+def _encode(payload) -> dict:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return {
+        "etag": '"' + hashlib.blake2b(raw, digest_size=16).hexdigest() + '"',
+        "gzip": gzip.compress(raw, compresslevel=6),
+        "raw_bytes": len(raw),
+    }
+
+
+def build_export(recommender):
+    """Serialize the full payload and every genre payload once, gzip-compressed.
+
+    Returns ``(manifest, payloads)`` where ``payloads`` maps a key ("all" or
+    "genre:<name>") to its ETag and compressed bytes.
+    """
+    payloads = {}
+    genres = []
+    for genre in recommender.genre_networks:
+        genre_data = recommender.get_genre_constellation_data(genre)
+        encoded = _encode(genre_data)
+        payloads[genre_key(genre)] = encoded
+        genres.append({
+            "name": genre,
+            "movieCount": genre_data["movieCount"],
+            "connectionCount": genre_data["connectionCount"],
+            "etag": encoded["etag"],
+            "bytes": len(encoded["gzip"]),
+        })
+    payloads[ALL_KEY] = _encode(recommender.get_constellation_data())
+
+    manifest = {
+        "build_id": f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        "created_at": time.time(),
+        "etag": payloads[ALL_KEY]["etag"],
+        "genres": genres,
+    }
+    return manifest, payloads
+
+
+def to_chunk_documents(build_id: str, payloads: dict):
+    """Split each compressed payload into documents of at most PART_BYTES."""
+    for key, encoded in payloads.items():
+        data = encoded["gzip"]
+        parts = max(1, -(-len(data) // PART_BYTES))
+        for part in range(parts):
+            yield {
+                "build_id": build_id,
+                "key": key,
+                "part": part,
+                "parts": parts,
+                "etag": encoded["etag"],
+                "data": data[part * PART_BYTES:(part + 1) * PART_BYTES],
+            }
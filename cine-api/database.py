@@ -1,23 +1,145 @@
 import motor.motor_asyncio
 from dotenv import load_dotenv
+import asyncio
 import os
 import pandas as pd
-from typing import List, Dict
-import bcrypt
+from typing import List, Dict, Iterable, Iterator, Union
+from auth_pool import hash_pool
+from metrics import timed
+import threading
+from pymongo import ReplaceOne, UpdateOne, IndexModel, ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo import monitoring
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection-pool events so pool pressure is visible from the API."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkins": 0,
+            "pool_clears": 0,
+        }
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+
+    def _inc(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def connection_checked_out(self, event):
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.counters["checkouts"] += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkout_wait_seconds_total += wait
+            self.checkout_wait_seconds_max = max(self.checkout_wait_seconds_max, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.counters["checkins"] += 1
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        self._inc("connections_created")
+
+    def connection_closed(self, event):
+        self._inc("connections_closed")
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failures")
+
+    def pool_cleared(self, event):
+        self._inc("pool_clears")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            checkouts = self.counters["checkouts"]
+            return {
+                **self.counters,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkout_wait_avg_ms": round(1000 * self.checkout_wait_seconds_total / checkouts, 3) if checkouts else 0.0,
+                "checkout_wait_max_ms": round(1000 * self.checkout_wait_seconds_max, 3),
+            }
+
+
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+}
+pool_metrics = PoolMetrics()
+client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI, event_listeners=[pool_metrics], **POOL_OPTIONS)
 db = client["cine_db"]
 
+# Applied at startup and to staging collections before they replace the live ones.
+INDEXES = {
+    "users": [IndexModel([("email", ASCENDING)], unique=True, name="email_unique")],
+    "movies": [IndexModel([("movieId", ASCENDING)], name="movieId")],
+    "ratings": [IndexModel([("movieId", ASCENDING)], name="movieId"),
+                IndexModel([("userId", ASCENDING)], name="userId")],
+    "similarities": [IndexModel([("movieId", ASCENDING)], unique=True, name="movieId_unique")],
+    "rating_stats": [IndexModel([("movieId", ASCENDING)], unique=True, name="movieId_unique")],
+    "constellation_chunks": [IndexModel([("build_id", ASCENDING), ("key", ASCENDING), ("part", ASCENDING)],
+                                        name="build_key_part")],
+}
+
+
+@timed("db.ensure_indexes")
+async def ensure_indexes():
+    for name, indexes in INDEXES.items():
+        try:
+            await db[name].create_indexes(indexes)
+        except PyMongoError as e:
+            print(f"Could not create indexes on {name}: {e}")
+
+
+def get_pool_stats():
+    return {"options": POOL_OPTIONS, **pool_metrics.snapshot()}
+
+BULK_BATCH_SIZE = int(os.getenv("MONGO_BULK_BATCH_SIZE", "5000"))
+BULK_CONCURRENCY = int(os.getenv("MONGO_BULK_CONCURRENCY", "4"))
+
+@timed("db.create_user")
 async def create_user(email: str, password: str):
-    existing_user = await db.users.find_one({"email": email})
+    existing_user = await db.users.find_one({"email": email}, {"_id": 1})
     if existing_user:
         return None
 
-    hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    hashed_pw = await hash_pool.hash_password(password)
     user = { "email": email, "password": hashed_pw }
-    result = await db.users.insert_one(user)
+    try:
+        result = await db.users.insert_one(user)
+    except DuplicateKeyError:
+        return None  # lost a signup race for the same email
 
     # Prepare a clean response
     return {
@@ -26,11 +148,12 @@ async def create_user(email: str, password: str):
     }
 
 
+@timed("db.verify_user")
 async def verify_user(email: str, password: str):
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, {"email": 1, "password": 1})
     if not user:
         return None
-    if bcrypt.checkpw(password.encode(), user["password"].encode()):
+    if await hash_pool.verify_password(password, user["password"]):
         return {
             "id": str(user["_id"]),
             "email": user["email"]
@@ -38,42 +161,177 @@ async def verify_user(email: str, password: str):
     return None
 
 
+def _frame_records(df: pd.DataFrame, chunk_size: int = BULK_BATCH_SIZE) -> Iterator[Dict]:
+    # Convert slice by slice so the whole frame is never held as dicts at once.
+    for start in range(0, len(df), chunk_size):
+        yield from df.iloc[start:start + chunk_size].to_dict("records")
+
+def _batches(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@timed("db.bulk_insert")
+async def bulk_insert(collection, records: Iterable[Dict], batch_size: int = BULK_BATCH_SIZE,
+                      concurrency: int = BULK_CONCURRENCY) -> int:
+    """Insert records in unordered batches with at most ``concurrency`` writes in flight.
+
+    ``records`` is consumed off the event loop, one batch at a time.
+
+    Stops scheduling batches after the first failed write and re-raises it once
+    the in-flight writes settle, so callers never publish a partial load.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    failed = []
+    written = 0
+
+    async def write(batch):
+        try:
+            await collection.insert_many(batch, ordered=False)
+        except Exception as exc:
+            failed.append(exc)
+            raise
+        finally:
+            semaphore.release()
+
+    loop = asyncio.get_running_loop()
+    batches = _batches(records, batch_size)
+    while True:
+        # Records may be parsed or converted lazily (CSV chunks, to_dict); pull
+        # each batch on a worker thread so the event loop keeps serving requests.
+        batch = await loop.run_in_executor(None, next, batches, None)
+        if batch is None:
+            break
+        await semaphore.acquire()
+        if failed:
+            semaphore.release()
+            break
+        tasks.append(asyncio.create_task(write(batch)))
+        written += len(batch)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return written
+
+@timed("db.replace_collection")
+async def replace_collection(name: str, records: Iterable[Dict]) -> int:
+    """Load records into a staging collection, then rename it over ``name``.
+
+    Readers see the old documents until the rename, never an empty collection.
+    """
+    staging = db[f"{name}__staging"]
+    await staging.drop()
+    written = await bulk_insert(staging, records)
+    if written:
+        # The rename replaces the live collection's indexes too, so build them first.
+        if name in INDEXES:
+            await staging.create_indexes(INDEXES[name])
+        await staging.rename(name, dropTarget=True)
+    else:
+        await db[name].delete_many({})
+    return written
+
+@timed("db.insert_movies")
 async def insert_movies(movies_df: pd.DataFrame):
-    records = movies_df.to_dict("records")
-    await db.movies.delete_many({})
+    await replace_collection("movies", _frame_records(movies_df))
+
+@timed("db.insert_ratings")
+async def insert_ratings(ratings: Union[pd.DataFrame, Iterable[Dict]]):
+    """Replace the ratings collection from a frame or a stream of records."""
+    records = _frame_records(ratings) if isinstance(ratings, pd.DataFrame) else ratings
+    await replace_collection("ratings", records)
+    # Deltas were relative to the ratings just replaced.
+    await db.rating_stats.delete_many({})
+
+@timed("db.append_ratings")
+async def append_ratings(records: List[Dict]):
     if records:
-        await db.movies.insert_many(records)
+        await db.ratings.insert_many(records, ordered=False)
+
+@timed("db.increment_rating_stats")
+async def increment_rating_stats(totals: pd.DataFrame):
+    """Add per-movie ``sum``/``count`` of newly appended ratings to the running deltas."""
+    if not totals.empty:
+        await db.rating_stats.bulk_write([
+            UpdateOne({"movieId": int(mid)}, {"$inc": {"sum": float(total), "count": int(count)}}, upsert=True)
+            for mid, total, count in zip(totals.index, totals["sum"], totals["count"])
+        ], ordered=False)
 
-async def insert_ratings(ratings_df: pd.DataFrame):
-    records = ratings_df.to_dict("records")
-    await db.ratings.delete_many({})
+@timed("db.load_rating_stats")
+async def load_rating_stats() -> pd.DataFrame:
+    docs = await db.rating_stats.find({}, {"_id": 0, "movieId": 1, "sum": 1, "count": 1}).to_list(None)
+    return pd.DataFrame(docs, columns=["movieId", "sum", "count"]).set_index("movieId")
+
+@timed("db.insert_similarity_matrix")
+async def insert_similarity_matrix(matrix: Iterable[Dict]):
+    await replace_collection("similarities", matrix)
+
+@timed("db.append_movies")
+async def append_movies(records: List[Dict]):
     if records:
-        await db.ratings.insert_many(records)
+        await db.movies.insert_many(records, ordered=False)
 
-async def insert_similarity_matrix(matrix: List[Dict]):
-    await db.similarities.delete_many({})
-    await db.similarities.insert_many(matrix)
+@timed("db.upsert_similarity_docs")
+async def upsert_similarity_docs(docs: List[Dict]):
+    if docs:
+        await db.similarities.bulk_write(
+            [ReplaceOne({"movieId": doc["movieId"]}, doc, upsert=True) for doc in docs], ordered=False)
 
+@timed("db.load_movies")
 async def load_movies():
     return await db.movies.find().to_list(None)
 
+@timed("db.load_ratings")
 async def load_ratings():
     return await db.ratings.find().to_list(None)
 
+@timed("db.load_similarity_matrix")
 async def load_similarity_matrix():
     return await db.similarities.find().to_list(None)
 
+@timed("db.save_constellation_data")
 async def save_constellation_data(data: dict):
     await db.constellations.delete_many({})
     await db.constellations.insert_one(data)
 
+@timed("db.load_constellation_data")
 async def load_constellation_data():
     return await db.constellations.find_one()
 
+@timed("db.save_constellation_export")
+async def save_constellation_export(manifest: Dict, chunk_docs: Iterable[Dict]):
+    """Store a new export build, then point the manifest at it and drop older builds."""
+    try:
+        await bulk_insert(db.constellation_chunks, chunk_docs, batch_size=4)
+    except Exception:
+        await db.constellation_chunks.delete_many({"build_id": manifest["build_id"]})
+        raise
+    await db.constellation_manifest.replace_one({"_id": "current"}, {"_id": "current", **manifest}, upsert=True)
+    await db.constellation_chunks.delete_many({"build_id": {"$ne": manifest["build_id"]}})
+
+@timed("db.load_constellation_manifest")
+async def load_constellation_manifest():
+    return await db.constellation_manifest.find_one({"_id": "current"})
+
+@timed("db.load_constellation_payload")
+async def load_constellation_payload(build_id: str, key: str):
+    docs = await db.constellation_chunks.find(
+        {"build_id": build_id, "key": key}, {"_id": 0, "part": 1, "data": 1}
+    ).sort("part", 1).to_list(None)
+    return b"".join(bytes(d["data"]) for d in docs) if docs else None
+
 
 def get_db():
     return db
 
+@timed("db.add_watched_movie")
 async def add_watched_movie(email: str, movie_id: int, movie_title: str):
     result = await db.users.update_one(
         {"email": email},
@@ -81,12 +339,14 @@ async def add_watched_movie(email: str, movie_id: int, movie_title: str):
     )
     return result.modified_count > 0
 
+@timed("db.get_watched_movies")
 async def get_watched_movies(email: str):
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, {"_id": 0, "watched_movies": 1})
     if user and "watched_movies" in user:
         return user["watched_movies"]
     return []
 
+@timed("db.remove_watched_movie")
 async def remove_watched_movie(email: str, movie_id: int):
     result = await db.users.update_one(
         {"email": email},
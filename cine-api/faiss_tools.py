@@ -0,0 +1,155 @@
+# faiss_tools.py
+#
+# Build compressed / approximate variants of the movie index and compare them
+# against the exact one.
+#
+#   python faiss_tools.py build --mode ivfpq --nlist 1024 --pq-m 32
+#   python faiss_tools.py bench --modes flat ivf ivfpq hnsw --nprobe 8 16 32 --ef-search 64 128
+
+import argparse
+import json
+import math
+import time
+
+import faiss
+import numpy as np
+
+from ml_engine import INDEX_PATH, index_path_for, apply_search_params
+
+MODES = ("flat", "ivf", "ivfpq", "hnsw")
+
+
+def load_vectors(path: str = INDEX_PATH):
+    """Recover the raw embeddings and metric from the exact (flat) index."""
+    flat = faiss.read_index(path)
+    return flat.reconstruct_n(0, flat.ntotal).astype(np.float32), flat.metric_type
+
+
+def default_nlist(n: int) -> int:
+    return max(1, min(65536, int(4 * math.sqrt(n))))
+
+
+def build_index(vectors, metric, mode: str, nlist: int = None, pq_m: int = 16, pq_bits: int = 8, hnsw_m: int = 32):
+    n, dim = vectors.shape
+    if mode == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif mode in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if mode == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits, metric)
+        index.train(vectors)
+    elif mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric)
+    else:
+        raise ValueError(f"Unknown index mode {mode!r}; expected one of {MODES}")
+    index.add(vectors)
+    return index
+
+
+def index_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def sample_queries(vectors, count: int, seed: int = 0):
+    # Perturbed catalog vectors: realistic neighbourhoods without needing the text model.
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    noise = rng.normal(scale=0.05 * float(np.std(vectors)), size=picked.shape).astype(np.float32)
+    return picked + noise
+
+
+def benchmark(index, queries, truth, k: int):
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(np.intersect1d(found[0], truth[i]))
+    start = time.perf_counter()
+    index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+        "batch_qps": round(len(queries) / batch_seconds, 1) if batch_seconds > 0 else None,
+        "index_bytes": index_bytes(index),
+    }
+
+
+def run_benchmark(args):
+    vectors, metric = load_vectors(args.source)
+    queries = sample_queries(vectors, args.queries)
+    exact = build_index(vectors, metric, "flat")
+    _, truth = exact.search(queries, args.k)
+
+    report = {"movies": int(len(vectors)), "dim": int(vectors.shape[1]), "k": args.k, "queries": len(queries), "runs": []}
+    for mode in args.modes:
+        start = time.perf_counter()
+        index = build_index(vectors, metric, mode, args.nlist, args.pq_m, args.pq_bits, args.hnsw_m)
+        build_seconds = round(time.perf_counter() - start, 3)
+        if mode in ("ivf", "ivfpq"):
+            settings = [{"nprobe": p} for p in args.nprobe]
+        elif mode == "hnsw":
+            settings = [{"ef_search": ef} for ef in args.ef_search]
+        else:
+            settings = [{}]
+        for params in settings:
+            apply_search_params(index, **params)
+            result = benchmark(index, queries, truth, args.k)
+            report["runs"].append({"mode": mode, "build_seconds": build_seconds, **params, **result})
+            print(json.dumps(report["runs"][-1]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def run_build(args):
+    vectors, metric = load_vectors(args.source)
+    index = build_index(vectors, metric, args.mode, args.nlist, args.pq_m, args.pq_bits, args.hnsw_m)
+    path = args.output or index_path_for(args.mode)
+    faiss.write_index(index, path)
+    print(f"Wrote {args.mode} index with {index.ntotal} vectors ({index_bytes(index)} bytes) to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and benchmark movie index variants")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--source", default=INDEX_PATH, help="exact index holding the embeddings")
+        p.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(N))")
+        p.add_argument("--pq-m", type=int, default=16, help="PQ sub-quantizers")
+        p.add_argument("--pq-bits", type=int, default=8)
+        p.add_argument("--hnsw-m", type=int, default=32)
+        p.add_argument("--output", default=None)
+
+    build = sub.add_parser("build", help="write an index variant next to the exact one")
+    build.add_argument("--mode", choices=MODES, required=True)
+    common(build)
+    build.set_defaults(func=run_build)
+
+    bench = sub.add_parser("bench", help="recall@k, latency and memory per mode")
+    bench.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--queries", type=int, default=1000)
+    bench.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+    bench.add_argument("--ef-search", type=int, nargs="+", default=[32, 128])
+    common(bench)
+    bench.set_defaults(func=run_benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# ingest.py
+
+import time
+
+import numpy as np
+import pandas as pd
+
+RATING_DTYPES = {"userId": "int32", "movieId": "int32", "rating": "float32", "timestamp": "uint32"}
+MOVIE_DTYPES = {"movieId": "int32", "title": "object", "genres": "object"}
+RATINGS_CHUNK_ROWS = 1_000_000
+# Chunk size when streaming a ratings CSV into Mongo (bulk_insert reads it off the event loop).
+RECORD_CHUNK_ROWS = 100_000
+
+
+def read_movies(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=MOVIE_DTYPES)
+
+
+class RatingAggregator:
+    """Running per-movie rating sum and count, folded chunk by chunk."""
+
+    def __init__(self):
+        self.sums = pd.Series(dtype=np.float64)
+        self.counts = pd.Series(dtype=np.int64)
+        self.rows = 0
+
+    def fold(self, chunk: pd.DataFrame):
+        # Sum in float64: float32 accumulation drifts on movies with millions of ratings.
+        grouped = chunk["rating"].astype(np.float64).groupby(chunk["movieId"], sort=False)
+        self.sums = self.sums.add(grouped.sum(), fill_value=0)
+        self.counts = self.counts.add(grouped.count(), fill_value=0)
+        self.rows += len(chunk)
+
+    def result(self) -> pd.DataFrame:
+        """Same shape as ``ratings.groupby('movieId')['rating'].agg(['mean', 'count'])``."""
+        counts = self.counts.astype(np.int64)
+        movie_ratings = pd.DataFrame({"mean": self.sums / counts, "count": counts}).sort_index()
+        movie_ratings.index = movie_ratings.index.astype(np.int64).rename("movieId")
+        return movie_ratings
+
+
+def ingest_ratings(path: str, chunksize: int = RATINGS_CHUNK_ROWS, keep_ratings: bool = True):
+    """Stream a ratings CSV with compact dtypes, folding aggregates as chunks arrive.
+
+    Returns ``(ratings_df, movie_ratings, stats)``. With ``keep_ratings=False``
+    the raw rows are dropped after folding and ``ratings_df`` is None.
+    """
+    start = time.perf_counter()
+    aggregator = RatingAggregator()
+    chunks = []
+    for chunk in pd.read_csv(path, dtype=RATING_DTYPES, chunksize=chunksize):
+        aggregator.fold(chunk)
+        if keep_ratings:
+            chunks.append(chunk)
+    elapsed = time.perf_counter() - start
+
+    ratings_df = None
+    if keep_ratings:
+        ratings_df = (pd.concat(chunks, ignore_index=True) if chunks
+                      else pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in RATING_DTYPES.items()}))
+    stats = {
+        "rows": aggregator.rows,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(aggregator.rows / elapsed) if elapsed > 0 else None,
+    }
+    print(f"Ingested {stats['rows']} ratings in {elapsed:.2f}s ({stats['rows_per_sec']} rows/s)")
+    return ratings_df, aggregator.result(), stats
+
+
+def read_rating_records(path: str, chunksize: int = RECORD_CHUNK_ROWS):
+    """Yield the rows of a ratings CSV as dicts, holding one chunk at a time."""
+    for chunk in pd.read_csv(path, dtype=RATING_DTYPES, chunksize=chunksize):
+        yield from chunk.to_dict("records")
@@ -0,0 +1,118 @@
+# jobs.py
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Model-building work runs here, one job stage at a time, so it never competes
+# with the default executor used by request handlers.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cine-job")
+
+MAX_JOBS = 100
+
+jobs = {}
+_job_lock = None
+_tasks = set()
+
+
+class Job:
+    def __init__(self, kind: str, stages: list, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.planned_stages = list(stages)
+        self.stages = []
+        self.current_stage = None
+        self.error = None
+        self.details = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    async def run(self, name: str, fn, *args):
+        """Run one pipeline stage and record its timing.
+
+        Coroutine functions are awaited on the loop (Mongo I/O); plain
+        callables are CPU-bound and go to the job executor.
+        """
+        self.current_stage = name
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(fn):
+            result = await fn(*args)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        self.stages.append({"name": name, "seconds": round(time.perf_counter() - start, 4)})
+        self.current_stage = None
+        return result
+
+    def to_dict(self):
+        total = len(self.planned_stages)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": len(self.stages) / total if total else None,
+            "current_stage": self.current_stage,
+            "stages": self.stages,
+            "planned_stages": self.planned_stages,
+            "error": self.error,
+            "details": self.details,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def job_lock() -> asyncio.Lock:
+    """Held while a job runs; anything else that swaps the live model should take it too."""
+    global _job_lock
+    if _job_lock is None:
+        _job_lock = asyncio.Lock()
+    return _job_lock
+
+
+async def _run_job(job: Job, pipeline):
+    # Jobs replace the live recommender, so they must not interleave.
+    async with job_lock():
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            await pipeline(job)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed during {job.current_stage}: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+
+def _evict_finished():
+    finished = [j for j in jobs.values() if j.finished_at is not None]
+    finished.sort(key=lambda j: j.finished_at)
+    while len(jobs) > MAX_JOBS and finished:
+        jobs.pop(finished.pop(0).id, None)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def submit_job(kind: str, stages: list, pipeline, job_id: str = None) -> Job:
+    """Schedule ``pipeline(job)`` on the running loop and return immediately.
+
+    Pass ``job_id`` (from ``new_job_id``) when files must be staged under the
+    job's id before it is queued.
+    """
+    job = Job(kind, stages, job_id)
+    jobs[job.id] = job
+    _evict_finished()
+    task = asyncio.get_running_loop().create_task(_run_job(job, pipeline))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+def get_job(job_id: str):
+    return jobs.get(job_id)
@@ -1,19 +1,41 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from pydantic import BaseModel
-from cine_stellation_recommender import CineStellationRecommender
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
+from pydantic import BaseModel, Field
+from cine_stellation_recommender import CineStellationRecommender, shutdown_genre_pool
 from database import insert_movies, insert_ratings, insert_similarity_matrix, load_movies, load_ratings, load_similarity_matrix
 import shutil
 import os
+import asyncio
+from functools import partial
 import pandas as pd
 from fastapi import Body
 from fastapi.middleware.cors import CORSMiddleware
-from database import create_user, verify_user, save_constellation_data, load_constellation_data
-from fastapi.responses import JSONResponse
+from database import create_user, verify_user, load_constellation_data
+from database import save_constellation_export, load_constellation_manifest, load_constellation_payload
+from database import ensure_indexes, get_pool_stats, increment_rating_stats, load_rating_stats
+from pymongo.errors import PyMongoError
+from auth_pool import AuthBusyError, hash_pool
+from metrics import observe, render_prometheus, flatten, profiler
+from fastapi.responses import PlainTextResponse
+import time
+from constellation_export import build_export, to_chunk_documents, genre_key, ALL_KEY
+from fastapi.responses import JSONResponse, Response
+import gzip
+from jobs import submit_job, get_job, new_job_id, job_lock
+from cache import TTLCache
+from model_store import save_recommender, load_recommender, prune_builds, current_build
+from ingest import read_rating_records
 
 from pydantic import BaseModel
 from database import add_watched_movie, get_watched_movies
 
-from database import remove_watched_movie
+from database import remove_watched_movie, append_ratings, append_movies, upsert_similarity_docs
+from typing import List, Optional, Union
+
+class ProfilerRequest(BaseModel):
+    enabled: bool
+    # A zero interval would walk every thread's stack in a tight loop holding the GIL.
+    interval_ms: float = Field(10, ge=1)
+    reset: bool = False
 
 class RemoveWatchedRequest(BaseModel):
     email: str
@@ -26,6 +48,20 @@ class WatchedMovieRequest(BaseModel):
 
 app = FastAPI()
 recommender = None
+# Bumped on every swap of ``recommender``; caches key on it rather than holding the old model.
+model_generation = 0
+
+def _publish_model(model):
+    global recommender, model_generation
+    recommender = model
+    model_generation += 1
+
+# email -> {"generation": model_generation, "watched": sorted watched ids, "results": {top_n: recommendations}}
+# (export build_id, payload key) -> gzip bytes; builds are immutable so only eviction matters.
+export_payload_cache = TTLCache(int(os.getenv("EXPORT_CACHE_SIZE", "64")), float(os.getenv("EXPORT_CACHE_TTL_SECONDS", "86400")))
+
+user_recommendation_cache = TTLCache(int(os.getenv("USER_RECS_CACHE_SIZE", "10000")),
+                                     float(os.getenv("USER_RECS_CACHE_TTL_SECONDS", "3600")))
 
 # Allow frontend to make requests
 app.add_middleware(
@@ -36,6 +72,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class BatchRecommendRequest(BaseModel):
+    movie_ids: List[int]
+    top_n: int = 5
+
+class RatingEntry(BaseModel):
+    userId: int
+    movieId: int
+    rating: float
+    timestamp: Optional[int] = None
+
+class RatingsBatch(BaseModel):
+    ratings: List[RatingEntry]
+
+class MovieEntry(BaseModel):
+    movieId: int
+    title: str
+    genres: Union[str, List[str]] = "(no genres listed)"
+
+class MoviesBatch(BaseModel):
+    movies: List[MovieEntry]
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    failed = True
+    try:
+        response = await call_next(request)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        # Label by route template so /recommend/1 and /recommend/2 share a series.
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        observe(f"http {request.method} {path}", time.perf_counter() - start, failed)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    gauges = {
+        **flatten("cine_mongo_pool", get_pool_stats()),
+        **flatten("cine_auth", hash_pool.snapshot()),
+        "cine_profiler_running": int(profiler.running),
+    }
+    return PlainTextResponse(render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler")
+async def toggle_profiler(req: ProfilerRequest):
+    if req.reset:
+        profiler.reset()
+    if req.enabled:
+        profiler.start(req.interval_ms)
+    else:
+        await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return {"running": profiler.running, "samples": profiler.samples}
+
+@app.get("/debug/profiler")
+async def profiler_stacks(limit: int = 200):
+    return PlainTextResponse(profiler.collapsed(limit))
+
 class AuthRequest(BaseModel):
     email: str
     password: str
@@ -44,10 +138,92 @@ class ConstellationRequest(BaseModel):
     min_ratings: int = 20
     similarity_threshold: float = 0.2
     max_connections: int = 5
+    workers: int = Field(1, ge=1)
+
+_index_task = None
+
+@app.on_event("startup")
+async def create_indexes():
+    # Idempotent; run in the background so an unreachable Mongo doesn't hold up startup.
+    global _index_task
+    _index_task = asyncio.create_task(ensure_indexes())
+
+@app.get("/db/pool-stats")
+async def pool_stats():
+    return get_pool_stats()
+
+# Ratings posted after a model was built live as per-movie deltas in Mongo;
+# every worker folds them in on load, before each swap and on a timer. The
+# same timer picks up artifact builds saved by jobs in other workers.
+RATINGS_SYNC_SECONDS = float(os.getenv("RATINGS_SYNC_SECONDS", "30"))
+_ratings_lock = asyncio.Lock()
+_ratings_sync_task = None
+
+async def _sync_ratings(model):
+    """Apply rating deltas stored in Mongo that ``model`` has not seen yet."""
+    async with _ratings_lock:
+        return model.apply_rating_totals(await load_rating_stats())
+
+async def _try_sync_ratings(model):
+    try:
+        return await _sync_ratings(model)
+    except PyMongoError as e:
+        print(f"Could not sync rating deltas: {e}")
+        return 0
+
+async def _reload_if_rebuilt():
+    """Swap in the CURRENT artifact if another worker has saved a newer build."""
+    lock = job_lock()
+    if lock.locked():
+        return  # a local job is about to publish its own model
+    async with lock:
+        path = current_build()
+        live_build = recommender.build_id if recommender is not None else None
+        if path is None or os.path.basename(path) == live_build:
+            return
+        try:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, load_recommender)
+        except (OSError, ValueError) as e:
+            print(f"Could not reload recommender artifact: {e}")
+            return
+        if loaded:
+            await _try_sync_ratings(loaded)
+            _publish_model(loaded)
+
+async def _sync_ratings_forever():
+    while True:
+        await asyncio.sleep(RATINGS_SYNC_SECONDS)
+        await _reload_if_rebuilt()
+        if recommender is not None:
+            await _try_sync_ratings(recommender)
+
+@app.on_event("startup")
+async def load_saved_recommender():
+    # Every worker maps the same on-disk build, so this is cheap and shares pages.
+    global _ratings_sync_task
+    loaded = await asyncio.get_running_loop().run_in_executor(None, load_recommender)
+    if loaded:
+        await _try_sync_ratings(loaded)
+    _publish_model(loaded)
+    if RATINGS_SYNC_SECONDS > 0:
+        _ratings_sync_task = asyncio.create_task(_sync_ratings_forever())
+
+@app.on_event("shutdown")
+async def stop_constellation_pool():
+    await asyncio.get_running_loop().run_in_executor(None, shutdown_genre_pool)
+
+def _save_artifact(new_recommender):
+    save_recommender(new_recommender)
+    prune_builds()
 
 @app.post("/initialize")
 async def initialize():
-    global recommender
+    loaded = await asyncio.get_running_loop().run_in_executor(None, load_recommender)
+    if loaded:
+        await _sync_ratings(loaded)
+        _publish_model(loaded)
+        return {"message": "Recommender initialized from saved artifact."}
+
     movies_data = await load_movies()
     ratings_data = await load_ratings()
     similarity_data = await load_similarity_matrix()
@@ -56,72 +232,232 @@ async def initialize():
         print("✅ Loaded data from MongoDB.")
         movies_df = pd.DataFrame(movies_data)
         ratings_df = pd.DataFrame(ratings_data)
-        recommender = CineStellationRecommender(dataframe_mode=True)
-        recommender.set_dataframes(ratings_df, movies_df)
-        recommender.build_genre_lists()
+        model = CineStellationRecommender(dataframe_mode=True)
+        model.set_dataframes(ratings_df, movies_df)
+        model.build_genre_lists()
+        # The ratings collection already holds every appended rating.
+        model.rating_deltas = (await load_rating_stats()).astype("float64")
         if similarity_data:
-            recommender.load_similarity_from_mongo(similarity_data)
+            model.load_similarity_from_mongo(similarity_data)
+            await asyncio.get_running_loop().run_in_executor(None, _save_artifact, model)
+        _publish_model(model)
         return {"message": "Recommender initialized from MongoDB."}
     else:
         print("⚠️ No data found in MongoDB, falling back to CSVs.")
-        recommender = CineStellationRecommender("models/ratings.csv", "models/movies.csv")
-        recommender.preprocess_data()
-        await insert_movies(recommender.movies_df)
-        await insert_ratings(recommender.ratings_df)
+        model = CineStellationRecommender("models/ratings.csv", "models/movies.csv")
+        _publish_model(model)
+        await insert_movies(model.movies_df)
+        await insert_ratings(read_rating_records("models/ratings.csv"))
         return {"message": "Initialized from local CSV and inserted to MongoDB."}
 
-@app.post("/upload-dataset")
-async def upload_dataset(movies_file: UploadFile = File(...), ratings_file: UploadFile = File(...)):
-    global recommender
+def _copy_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
 
-    os.makedirs("models", exist_ok=True)
-    movies_path = os.path.join("models", "movies.csv")
-    ratings_path = os.path.join("models", "ratings.csv")
+UPLOAD_DIR = os.path.join("models", "uploads")
 
-    with open(movies_path, "wb") as f:
-        shutil.copyfileobj(movies_file.file, f)
-    with open(ratings_path, "wb") as f:
-        shutil.copyfileobj(ratings_file.file, f)
+def _publish_upload(upload_dir: str):
+    # Same filesystem, so the /initialize CSV fallback sees either the old or the new file, never a partial one.
+    os.replace(os.path.join(upload_dir, "movies.csv"), os.path.join("models", "movies.csv"))
+    os.replace(os.path.join(upload_dir, "ratings.csv"), os.path.join("models", "ratings.csv"))
+
+@app.post("/upload-dataset", status_code=202)
+async def upload_dataset(movies_file: UploadFile = File(...), ratings_file: UploadFile = File(...)):
+    # Each upload gets its own directory so a queued or running job never reads a later upload's files.
+    job_id = new_job_id()
+    upload_dir = os.path.join(UPLOAD_DIR, job_id)
+    os.makedirs(upload_dir)
+    movies_path = os.path.join(upload_dir, "movies.csv")
+    ratings_path = os.path.join(upload_dir, "ratings.csv")
+
+    # Uploads are closed once the response is sent, so persist them before queueing the job.
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _copy_upload, movies_file, movies_path)
+        await loop.run_in_executor(None, _copy_upload, ratings_file, ratings_path)
+    except BaseException:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
 
-    recommender = CineStellationRecommender(ratings_path, movies_path)
-    recommender.preprocess_data()
-    recommender.compute_similarity()
-    await insert_movies(recommender.movies_df)
-    await insert_ratings(recommender.ratings_df)
-    await insert_similarity_matrix(recommender.serialize_similarity_matrix())
+    async def pipeline(job):
+        try:
+            new_recommender = await job.run("preprocess", CineStellationRecommender, ratings_path, movies_path)
+            job.details["ingest"] = new_recommender.ingest_stats
+            await job.run("compute_similarity", new_recommender.compute_similarity)
+            await job.run("store_movies", insert_movies, new_recommender.movies_df)
+            await job.run("store_ratings", insert_ratings, read_rating_records(ratings_path))
+            similarity_docs = await job.run("serialize_similarity", new_recommender.serialize_similarity_matrix)
+            await job.run("store_similarity", insert_similarity_matrix, similarity_docs)
+            await job.run("save_artifact", _save_artifact, new_recommender)
+            await job.run("sync_ratings", _sync_ratings, new_recommender)
+            _publish_model(new_recommender)
+            _publish_upload(upload_dir)
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
 
-    return {"message": "Dataset uploaded, processed, and stored in MongoDB."}
+    job = submit_job("upload-dataset", ["preprocess", "compute_similarity", "store_movies", "store_ratings",
+                                        "serialize_similarity", "store_similarity", "save_artifact",
+                                        "sync_ratings"], pipeline, job_id)
+    return {"message": "Dataset uploaded; processing started.", "job_id": job.id}
 
-@app.post("/compute-similarity")
+@app.post("/compute-similarity", status_code=202)
 async def compute_similarity():
     if not recommender:
         raise HTTPException(status_code=400, detail="Recommender not initialized")
-    recommender.compute_similarity()
-    await insert_similarity_matrix(recommender.serialize_similarity_matrix())
-    return {"message": "Similarity matrix computed and stored."}
 
-@app.post("/create-constellations")
+    async def pipeline(job):
+        new_recommender = recommender.clone()
+        await job.run("compute_similarity", new_recommender.compute_similarity)
+        similarity_docs = await job.run("serialize_similarity", new_recommender.serialize_similarity_matrix)
+        await job.run("store_similarity", insert_similarity_matrix, similarity_docs)
+        await job.run("save_artifact", _save_artifact, new_recommender)
+        await job.run("sync_ratings", _sync_ratings, new_recommender)
+        _publish_model(new_recommender)
+
+    job = submit_job("compute-similarity", ["compute_similarity", "serialize_similarity", "store_similarity",
+                                            "save_artifact", "sync_ratings"], pipeline)
+    return {"message": "Similarity computation started.", "job_id": job.id}
+
+@app.post("/create-constellations", status_code=202)
 async def create_constellations(req: ConstellationRequest):
     if not recommender:
         raise HTTPException(status_code=400, detail="Recommender not initialized")
-    recommender.create_genre_constellations(req.min_ratings, req.similarity_threshold, req.max_connections)
-    data = recommender.get_constellation_data()
-    await save_constellation_data(data)
-    return {"message": "Constellations created and saved to MongoDB"}
+
+    async def pipeline(job):
+        new_recommender = recommender.clone()
+        await job.run("build_constellations", partial(
+            new_recommender.create_genre_constellations,
+            req.min_ratings, req.similarity_threshold, req.max_connections, req.workers))
+        manifest, payloads = await job.run("export", build_export, new_recommender)
+        job.details["export"] = {"build_id": manifest["build_id"], "genres": len(manifest["genres"]),
+                                 "gzip_bytes": sum(len(p["gzip"]) for p in payloads.values())}
+        await job.run("store", save_constellation_export, manifest, to_chunk_documents(manifest["build_id"], payloads))
+        await job.run("sync_ratings", _sync_ratings, new_recommender)
+        _publish_model(new_recommender)
+
+    job = submit_job("create-constellations", ["build_constellations", "export", "store", "sync_ratings"], pipeline)
+    return {"message": "Constellation build started.", "job_id": job.id}
+
+@app.post("/movies", status_code=202)
+async def add_movies(batch: MoviesBatch):
+    if not recommender:
+        raise HTTPException(status_code=400, detail="Recommender not initialized")
+    if recommender.tfidf is None or recommender.movie_features is None:
+        raise HTTPException(status_code=409, detail="Similarity has not been computed for this model")
+    new_movies = pd.DataFrame([m.model_dump() for m in batch.movies])
+
+    async def pipeline(job):
+        new_recommender = recommender.clone()
+        changed = await job.run("embed_and_patch", new_recommender.add_movies, new_movies)
+        added = new_recommender.movies_df.iloc[len(recommender.movies_df):]
+        await job.run("store_movies", append_movies, added.to_dict("records"))
+        similarity_docs = await job.run("serialize_similarity", partial(
+            new_recommender.serialize_similarity_matrix, only_movie_ids=changed))
+        await job.run("store_similarity", upsert_similarity_docs, similarity_docs)
+        await job.run("save_artifact", _save_artifact, new_recommender)
+        await job.run("sync_ratings", _sync_ratings, new_recommender)
+        _publish_model(new_recommender)
+
+    job = submit_job("add-movies", ["embed_and_patch", "store_movies", "serialize_similarity",
+                                    "store_similarity", "save_artifact", "sync_ratings"], pipeline)
+    return {"message": "Movie ingestion started.", "job_id": job.id}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/ratings")
+async def add_ratings(batch: RatingsBatch):
+    if not recommender:
+        raise HTTPException(status_code=400, detail="Recommender not initialized")
+    records = [r.model_dump(exclude_none=True) for r in batch.ratings]
+    if not records:
+        return {"received": 0, "applied": 0}
+    new_ratings = pd.DataFrame(records)
+    # Persist first; the lock keeps a concurrent sync from applying this batch twice.
+    async with _ratings_lock:
+        await append_ratings(records)
+        await increment_rating_stats(new_ratings.groupby("movieId")["rating"].agg(["sum", "count"]))
+        applied = recommender.add_ratings(new_ratings)
+    return {"received": len(records), "applied": applied}
 
 @app.get("/recommend/{movie_id}")
-def recommend(movie_id: int, top_n: int = 5):
+def recommend(movie_id: int, top_n: int = 5, w_similarity: float = 1.0, w_rating: float = 0.0,
+              w_popularity: float = 0.0, w_recency: float = 0.0):
     if not recommender:
         raise HTTPException(status_code=400, detail="Recommender not initialized")
-    return recommender.recommend_similar_movies(movie_id, top_n)
+    if w_similarity == 1.0 and not (w_rating or w_popularity or w_recency):
+        return recommender.recommend_similar_movies(movie_id, top_n)
+    return recommender.recommend_hybrid(movie_id, top_n, w_similarity, w_rating, w_popularity, w_recency)
+
+@app.post("/recommend/batch")
+def recommend_batch(req: BatchRecommendRequest):
+    if not recommender:
+        raise HTTPException(status_code=400, detail="Recommender not initialized")
+    return {"results": recommender.recommend_similar_movies_batch(req.movie_ids, req.top_n)}
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @app.get("/export")
-async def export():
-    data = await load_constellation_data()
-    if not data:
+async def export(request: Request, genre: Optional[str] = None):
+    manifest = await load_constellation_manifest()
+    if not manifest:
+        # Databases written before chunked exports still have the single document.
+        data = await load_constellation_data()
+        if not data or genre:
+            raise HTTPException(status_code=404, detail="Constellation data not found")
+        data.pop("_id", None)  # remove MongoDB ObjectId
+        return JSONResponse(content=data)
+
+    if genre:
+        entry = next((g for g in manifest["genres"] if g["name"] == genre), None)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"No constellation for genre {genre!r}")
+        key, etag = genre_key(genre), entry["etag"]
+    else:
+        key, etag = ALL_KEY, manifest["etag"]
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cache_key = (manifest["build_id"], key)
+    body = export_payload_cache.get(cache_key)
+    if body is None:
+        body = await load_constellation_payload(manifest["build_id"], key)
+        if body is None:
+            raise HTTPException(status_code=503, detail="Constellation export is being replaced; retry")
+        export_payload_cache.set(cache_key, body)
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/export/genres")
+async def export_genres():
+    manifest = await load_constellation_manifest()
+    if not manifest:
         raise HTTPException(status_code=404, detail="Constellation data not found")
-    data.pop("_id", None)  # remove MongoDB ObjectId
-    return JSONResponse(content=data)
+    return {"build_id": manifest["build_id"], "etag": manifest["etag"], "genres": manifest["genres"]}
+
+@app.exception_handler(AuthBusyError)
+async def auth_busy(request: Request, exc: AuthBusyError):
+    # Shed load instead of queueing unbounded bcrypt work behind the event loop.
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.get("/auth/metrics")
+async def auth_metrics():
+    return hash_pool.snapshot()
 
 @app.post("/users/signup")
 async def signup(auth: AuthRequest):
@@ -140,6 +476,7 @@ async def login(auth: AuthRequest):
 @app.post("/users/add-watched")
 async def add_watched(req: WatchedMovieRequest):
     success = await add_watched_movie(req.email, req.movie_id, req.movie_title)
+    user_recommendation_cache.pop(req.email)
     if not success:
         raise HTTPException(status_code=400, detail="Could not update watched list.")
     return {"message": "Movie added to watched list."}
@@ -149,25 +486,66 @@ async def fetch_watched(email: str):
     movies = await get_watched_movies(email)
     return {"watched_movies": movies}
 
+@app.get("/users/recommendations")
+async def user_recommendations(email: str, top_n: int = 10):
+    if not recommender:
+        raise HTTPException(status_code=400, detail="Recommender not initialized")
+    model, generation = recommender, model_generation
+    # The watched list is read every time (one projected lookup) so a change made
+    # through any worker invalidates this worker's entry; the ranking is what's cached.
+    watched = tuple(sorted(m["id"] for m in await get_watched_movies(email)))
+    entry = user_recommendation_cache.get(email)
+    # Entries built from a swapped-out model or an older watched list are stale.
+    if entry is None or entry["generation"] != generation or entry["watched"] != watched:
+        entry = {"generation": generation, "watched": watched, "results": {}}
+        user_recommendation_cache.set(email, entry)
+    if top_n not in entry["results"]:
+        entry["results"][top_n] = model.recommend_for_movies(list(watched), top_n)
+    return {"recommendations": entry["results"][top_n]}
+
 @app.post("/users/remove-watched")
 async def remove_watched(req: RemoveWatchedRequest):
     success = await remove_watched_movie(req.email, req.movie_id)
+    user_recommendation_cache.pop(req.email)
     if not success:
         raise HTTPException(status_code=400, detail="Could not remove watched movie.")
     return {"message": "Movie removed from watched list."}
 
 
 from pydantic import BaseModel
-from ml_engine import fetch_movies
+from ml_engine import query_batcher, warm_up_async, is_ready, readiness, set_search_params, INDEX_MODE, MAX_TOP_K
+
+_warm_up_task = None
+
+@app.on_event("startup")
+async def warm_up_ml_engine():
+    # Load in the background: the API serves other routes while the model loads.
+    global _warm_up_task
+    if os.getenv("ML_WARMUP", "1") != "0":
+        _warm_up_task = asyncio.create_task(warm_up_async())
+
+@app.get("/ml/ready")
+async def ml_ready():
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"ready": False, **readiness})
+    return {"ready": True, **readiness}
 
 class QueryRequest(BaseModel):
     query: str
-    top_k: int = 10
+    top_k: int = Field(10, ge=1, le=MAX_TOP_K)
+
+class SearchParamsRequest(BaseModel):
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
+@app.post("/ml/search-params")
+async def update_search_params(req: SearchParamsRequest):
+    return {"mode": INDEX_MODE, **set_search_params(req.nprobe, req.ef_search)}
 
 @app.post("/ml/query")
 async def query_movies(req: QueryRequest):
     try:
-        results = fetch_movies(req.query, top_k=req.top_k)
+        results = await query_batcher.submit(req.query, req.top_k)
         return {"results": results}
     except Exception as e:
         print("Error during ML query:", e)
@@ -0,0 +1,183 @@
+# metrics.py
+
+import asyncio
+import functools
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+_lock = threading.Lock()
+histograms = {}
+errors = Counter()
+
+
+def observe(stage: str, seconds: float, failed: bool = False):
+    with _lock:
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = Histogram()
+        histogram.observe(seconds)
+        if failed:
+            errors[stage] += 1
+
+
+@contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, failed)
+
+
+def timed(stage: str):
+    """Record the duration of every call to the decorated function, sync or async."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(gauges: dict = None) -> str:
+    """Prometheus text exposition of all stage histograms plus optional gauges."""
+    lines = [
+        "# HELP cine_stage_duration_seconds Time spent per instrumented stage.",
+        "# TYPE cine_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        snapshot = {stage: (list(h.buckets), h.count, h.sum) for stage, h in histograms.items()}
+        error_counts = dict(errors)
+    for stage, (buckets, count, total) in sorted(snapshot.items()):
+        label = _label(stage)
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'cine_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'cine_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {count}')
+        lines.append(f'cine_stage_duration_seconds_sum{{stage="{label}"}} {total}')
+        lines.append(f'cine_stage_duration_seconds_count{{stage="{label}"}} {count}')
+
+    lines += ["# HELP cine_stage_errors_total Calls that raised, per stage.",
+              "# TYPE cine_stage_errors_total counter"]
+    for stage, n in sorted(error_counts.items()):
+        lines.append(f'cine_stage_errors_total{{stage="{_label(stage)}"}} {n}')
+
+    for name, value in sorted((gauges or {}).items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def flatten(prefix: str, values: dict) -> dict:
+    """Turn a nested stats dict into flat metric names, e.g. cine_auth_hash_count."""
+    flat = {}
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(name, value))
+        else:
+            flat[name] = value
+    return flat
+
+
+class SamplingProfiler:
+    """Opt-in wall-clock profiler that samples every thread's stack on an interval.
+
+    Samples are aggregated as collapsed stacks ("frame;frame;frame count"),
+    the input format for flame graph tools.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = 0.01
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 10):
+        if self.running:
+            return
+        self.interval = interval_ms / 1000
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def _loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    stack = ";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})"
+                                     for f in traceback.extract_stack(frame))
+                    self.stacks[stack] += 1
+
+    def collapsed(self, limit: int = 200) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common(limit)) + "\n"
+
+
+profiler = SamplingProfiler()
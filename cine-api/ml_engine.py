@@ -1,53 +1,275 @@
 # ml_engine.py
 
 import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
+from cache import TTLCache
+from metrics import timed, timer
 
 # Constants
 DATA_PATH = "models/TMDB_all_movies.csv"
+METADATA_PATH = "models/TMDB_movies_meta.parquet"
 MODEL_PATH = "models/movie_retrieval_model_best"
 INDEX_PATH = "models/movie_index.faiss"
+# flat (exact), ivf, ivfpq or hnsw; variants are built with faiss_tools.py
+INDEX_MODE = os.getenv("ML_INDEX_MODE", "flat")
+RESULT_FIELDS = ("title", "overview", "release_date", "cast", "director")
+
+CACHE_SIZE = int(os.getenv("ML_CACHE_SIZE", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("ML_CACHE_TTL_SECONDS", "600"))
+BATCH_WINDOW_MS = float(os.getenv("ML_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "64"))
+# Upper bound on top_k; the largest top_k in a batch sets the search depth for all of it.
+MAX_TOP_K = int(os.getenv("ML_MAX_TOP_K", "100"))
+INFERENCE_THREADS = int(os.getenv("ML_INFERENCE_THREADS", "2"))
+
+# Encoding and FAISS search run here only, so ML load can't exhaust the
+# default executor the rest of the API relies on.
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="ml-inference")
 
 # Global cache
 model = None
 index = None
-movies_df = None
+movie_columns = None
+_load_lock = threading.Lock()
+search_params = {
+    "nprobe": int(os.environ["ML_NPROBE"]) if os.getenv("ML_NPROBE") else None,
+    "ef_search": int(os.environ["ML_EF_SEARCH"]) if os.getenv("ML_EF_SEARCH") else None,
+}
+readiness = {"state": "cold", "error": None, "load_seconds": None}
+
+
+embedding_cache = TTLCache(CACHE_SIZE, CACHE_TTL_SECONDS)
+result_cache = TTLCache(CACHE_SIZE, CACHE_TTL_SECONDS)
+
+
+def index_path_for(mode: str) -> str:
+    return INDEX_PATH if mode == "flat" else INDEX_PATH.replace(".faiss", f"_{mode}.faiss")
+
+
+def apply_search_params(target, nprobe=None, ef_search=None):
+    """Set IVF ``nprobe`` / HNSW ``efSearch`` on whichever index type ``target`` is."""
+    if nprobe is not None:
+        ivf = faiss.try_extract_index_ivf(target)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+    if ef_search is not None and hasattr(target, "hnsw"):
+        target.hnsw.efSearch = ef_search
+
+
+def set_search_params(nprobe=None, ef_search=None):
+    """Change search-time accuracy knobs on the live index and drop stale cached results."""
+    if nprobe is not None:
+        search_params["nprobe"] = nprobe
+    if ef_search is not None:
+        search_params["ef_search"] = ef_search
+    if index is not None:
+        apply_search_params(index, **search_params)
+    result_cache.clear()
+    return dict(search_params)
+
 
 def load_model_and_index():
-    global model, index, movies_df
+    global model, index, movie_columns
+
+    if model is not None and index is not None and movie_columns is not None:
+        return
+    with _load_lock:
+        _load_model_and_index()
+
+
+def _load_model_and_index():
+    global model, index, movie_columns
 
     if model is None:
         model = SentenceTransformer(MODEL_PATH)
         print("✅ Model loaded")
 
     if index is None:
-        index = faiss.read_index(INDEX_PATH)
-        print("✅ FAISS index loaded")
+        loaded = faiss.read_index(index_path_for(INDEX_MODE))
+        apply_search_params(loaded, **search_params)
+        index = loaded
+        print(f"✅ FAISS index loaded ({INDEX_MODE})")
+
+    if movie_columns is None:
+        movie_columns = _load_movie_columns()
+        print("✅ Movie metadata loaded")
+
 
+def _load_movie_columns():
+    """Load only the fields results return, preferring the compact parquet copy."""
+    movies_df = None
+    if os.path.exists(METADATA_PATH):
+        try:
+            movies_df = pd.read_parquet(METADATA_PATH)
+        except ImportError:
+            pass  # no parquet engine installed; read the CSV
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable {METADATA_PATH}: {e}")
     if movies_df is None:
-        movies_df = pd.read_csv(DATA_PATH)
-        print("✅ Movie CSV loaded")
+        movies_df = pd.read_csv(DATA_PATH, usecols=lambda c: c in RESULT_FIELDS)
+        _write_metadata_cache(movies_df)
+    # Plain string arrays indexed by FAISS id.
+    return {
+        field: (movies_df[field].fillna("").astype(str).to_numpy() if field in movies_df
+                else np.full(len(movies_df), "Unknown" if field == "title" else "", dtype=object))
+        for field in RESULT_FIELDS
+    }
 
-def fetch_movies(query: str, top_k: int = 10):
+
+def _write_metadata_cache(movies_df):
+    # Workers warm up concurrently: write aside and rename so readers never see a partial file.
+    tmp_path = f"{METADATA_PATH}.{os.getpid()}.tmp"
+    try:
+        movies_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, METADATA_PATH)
+    except ImportError:
+        pass  # no parquet engine installed; keep reading the CSV
+    except OSError as e:
+        # e.g. a read-only model volume; the CSV result is still good.
+        print(f"Not caching movie metadata as parquet: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def warm_up():
+    """Load everything and run one encode + search so the first query is fast."""
+    readiness["state"] = "loading"
+    start = time.perf_counter()
+    try:
+        load_model_and_index()
+        index.search(np.asarray(model.encode(["warm up"]), dtype=np.float32), 1)
+    except Exception as e:
+        readiness.update(state="failed", error=str(e))
+        print("ML warm-up failed:", e)
+        return
+    readiness.update(state="ready", error=None, load_seconds=round(time.perf_counter() - start, 3))
+    print(f"✅ ML engine ready in {readiness['load_seconds']}s")
+
+
+async def warm_up_async():
+    await asyncio.get_running_loop().run_in_executor(inference_executor, warm_up)
+
+
+def is_ready():
+    return readiness["state"] == "ready"
+
+
+def _rows_to_results(indices):
+    n = len(movie_columns["title"])
+    valid = [idx for idx in indices if 0 <= idx < n]
+    columns = {field: movie_columns[field][valid] for field in RESULT_FIELDS}
+    return [
+        {field: str(columns[field][i]) for field in RESULT_FIELDS}
+        for i in range(len(valid))
+    ]
+
+
+def _embed(queries):
+    """Embed unique queries, encoding only the ones not already cached."""
+    vectors = {}
+    missing = []
+    for query in queries:
+        cached = embedding_cache.get(query)
+        if cached is None:
+            missing.append(query)
+        else:
+            vectors[query] = cached
+    if missing:
+        with timer("ml.encode"):
+            encoded = np.asarray(model.encode(missing), dtype=np.float32)
+        for query, vector in zip(missing, encoded):
+            embedding_cache.set(query, vector)
+            vectors[query] = vector
+    return np.stack([vectors[q] for q in queries])
+
+
+@timed("ml.fetch_movies_batch")
+def fetch_movies_batch(queries, top_ks):
+    """Answer several queries with one encode call and one FAISS search."""
     load_model_and_index()
-    
-    query_embedding = model.encode([query])
-    distances, indices = index.search(query_embedding, k=top_k)
-
-    results = []
-    for idx in indices[0]:
-        if 0 <= idx < len(movies_df):
-            movie_row = movies_df.iloc[idx].fillna("")
-
-            results.append({
-                "title": str(movie_row.get("title", "Unknown")),
-                "overview": str(movie_row.get("overview", "")),
-                "release_date": str(movie_row.get("release_date", "")),
-                "cast": str(movie_row.get("cast", "")),
-                "director": str(movie_row.get("director", ""))
-            })
 
+    top_ks = [min(k, MAX_TOP_K) for k in top_ks]
+    results = [result_cache.get((q, k)) if k > 0 else [] for q, k in zip(queries, top_ks)]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if pending:
+        unique = list(dict.fromkeys(queries[i] for i in pending))
+        max_k = max(top_ks[i] for i in pending)
+        embeddings = _embed(unique)
+        with timer("ml.faiss_search"):
+            _, indices = index.search(embeddings, max_k)
+        row_of = {q: row for row, q in enumerate(unique)}
+        for i in pending:
+            query, k = queries[i], top_ks[i]
+            with timer("ml.metadata_lookup"):
+                results[i] = _rows_to_results(indices[row_of[query]][:k])
+            result_cache.set((query, k), results[i])
     return results
+
+
+def fetch_movies(query: str, top_k: int = 10):
+    return fetch_movies_batch([query], [top_k])[0]
+
+
+class QueryBatcher:
+    """Collect concurrent queries for a few milliseconds and run them as one batch."""
+
+    def __init__(self, window_ms: float = BATCH_WINDOW_MS, max_batch: int = MAX_BATCH_SIZE):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, query: str, top_k: int = 10):
+        cached = result_cache.get((query, top_k))
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_k, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        queries = [q for q, _, _ in batch]
+        top_ks = [k for _, k, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(inference_executor, fetch_movies_batch, queries, top_ks)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][2].done():
+                    batch[0][2].set_exception(e)
+                return
+            # Retry one by one so a single bad request doesn't fail the others.
+            for item in batch:
+                await self._run([item])
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+query_batcher = QueryBatcher()
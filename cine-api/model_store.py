@@ -0,0 +1,167 @@
+# model_store.py
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from cine_stellation_recommender import CineStellationRecommender
+
+FORMAT_VERSION = 1
+ARTIFACT_DIR = os.getenv("RECOMMENDER_ARTIFACT_DIR", "models/recommender")
+CURRENT_FILE = "CURRENT"
+# Hybrid-ranking priors derived from mean/count/year (see CineStellationRecommender._scoring_priors).
+PRIOR_COLUMNS = ("bayes_rating", "popularity", "recency")
+
+
+def _save_csr(path, prefix, matrix):
+    for name in ("data", "indices", "indptr"):
+        np.save(os.path.join(path, f"{prefix}_{name}.npy"), getattr(matrix, name))
+
+
+def _load_csr(path, prefix, shape):
+    arrays = tuple(np.load(os.path.join(path, f"{prefix}_{name}.npy"), mmap_mode="r")
+                   for name in ("data", "indices", "indptr"))
+    return sparse.csr_matrix(arrays, shape=shape, copy=False)
+
+
+def save_recommender(recommender: CineStellationRecommender, root: str = ARTIFACT_DIR) -> str:
+    """Write the trained state to a new build directory and point CURRENT at it.
+
+    Builds are never modified in place: readers holding an older build keep
+    their mmaps valid, and the CURRENT swap is a single atomic rename.
+    """
+    if recommender.similarity_matrix is None:
+        raise ValueError("Recommender has no similarity table to save")
+
+    os.makedirs(root, exist_ok=True)
+    build_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    tmp_path = os.path.join(root, f".{build_id}.tmp")
+    os.makedirs(tmp_path)
+
+    cols = recommender.movie_columns
+    n = len(cols["movieId"])
+    np.save(os.path.join(tmp_path, "movie_id.npy"), cols["movieId"])
+    np.save(os.path.join(tmp_path, "title.npy"), cols["title"].astype(str))
+    np.save(os.path.join(tmp_path, "genres.npy"), np.array(["|".join(g) for g in cols["genres"]], dtype=str))
+    np.save(os.path.join(tmp_path, "mean.npy"), cols["mean"])
+    np.save(os.path.join(tmp_path, "count.npy"), cols["count"])
+    for name in PRIOR_COLUMNS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), cols[name])
+    _save_csr(tmp_path, "neighbors", recommender.similarity_matrix)
+    deltas = recommender.rating_deltas
+    if deltas is not None:
+        np.save(os.path.join(tmp_path, "rating_delta_movie_id.npy"), deltas.index.to_numpy(dtype=np.int64))
+        np.save(os.path.join(tmp_path, "rating_delta_sum.npy"), deltas["sum"].to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp_path, "rating_delta_count.npy"), deltas["count"].to_numpy(dtype=np.float64))
+
+    has_features = recommender.tfidf is not None and recommender.movie_features is not None
+    if has_features:
+        _save_csr(tmp_path, "features", recommender.movie_features)
+        terms = np.empty(len(recommender.tfidf.vocabulary_), dtype=object)
+        for term, idx in recommender.tfidf.vocabulary_.items():
+            terms[idx] = term
+        np.save(os.path.join(tmp_path, "tfidf_terms.npy"), terms.astype(str))
+        np.save(os.path.join(tmp_path, "tfidf_idf.npy"), recommender.tfidf.idf_)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "build_id": build_id,
+        "created_at": time.time(),
+        "movies": n,
+        "neighbors": int(recommender.similarity_matrix.nnz),
+        "neighbor_k": recommender.neighbor_k,
+        "rating_deltas": deltas is not None,
+        "rating_prior_count": recommender.rating_prior_count,
+        "scoring_priors": True,
+        "features_shape": list(recommender.movie_features.shape) if has_features else None,
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    final_path = os.path.join(root, build_id)
+    os.rename(tmp_path, final_path)
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.{build_id}")
+    with open(pointer_tmp, "w") as f:
+        f.write(build_id)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+    recommender.build_id = build_id
+    print(f"Saved recommender artifact {build_id} ({n} movies)")
+    return final_path
+
+
+def current_build(root: str = ARTIFACT_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return os.path.join(root, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def load_recommender(root: str = ARTIFACT_DIR):
+    """Open the CURRENT build with its arrays memory-mapped, or return None."""
+    path = current_build(root)
+    if path is None or not os.path.isdir(path):
+        return None
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        print(f"Ignoring recommender artifact {meta.get('build_id')}: format {meta.get('format_version')} != {FORMAT_VERSION}")
+        return None
+
+    load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    movie_ids = load("movie_id")
+    titles = load("title")
+    genres = [g.split("|") if g else [] for g in load("genres").tolist()]
+    mean, count = load("mean"), load("count")
+
+    movies_df = pd.DataFrame({"movieId": movie_ids, "title": titles, "genres": genres})
+    movies_df["content"] = [" ".join([title] + g) for title, g in zip(titles.tolist(), genres)]
+
+    recommender = CineStellationRecommender(dataframe_mode=True)
+    recommender.build_id = meta["build_id"]
+    recommender.rating_prior_count = meta.get("rating_prior_count")
+    recommender.movies_df = movies_df
+    rated = count > 0
+    recommender.movie_ratings = pd.DataFrame(
+        {"mean": mean[rated], "count": count[rated]}, index=pd.Index(movie_ids[rated], name="movieId"))
+    recommender.movies_with_ratings = movies_df.assign(mean=mean, count=count)
+    recommender.build_movie_index()
+    if meta.get("scoring_priors"):
+        recommender.movie_columns.update({name: load(name) for name in PRIOR_COLUMNS})
+    recommender.id_to_title_map = dict(zip(recommender.movie_columns["movieId"].tolist(), titles.tolist()))
+
+    n = meta["movies"]
+    recommender.similarity_matrix = _load_csr(path, "neighbors", (n, n))
+    recommender.neighbor_k = meta.get("neighbor_k")
+    if meta.get("rating_deltas"):
+        recommender.rating_deltas = pd.DataFrame(
+            {"sum": np.asarray(load("rating_delta_sum")), "count": np.asarray(load("rating_delta_count"))},
+            index=pd.Index(np.asarray(load("rating_delta_movie_id")), name="movieId"))
+    if meta.get("features_shape"):
+        recommender.movie_features = _load_csr(path, "features", tuple(meta["features_shape"]))
+        terms = load("tfidf_terms")
+        tfidf = TfidfVectorizer(stop_words="english", dtype=np.float32)
+        tfidf.vocabulary_ = {str(term): idx for idx, term in enumerate(terms)}
+        tfidf.idf_ = np.asarray(load("tfidf_idf"))
+        recommender.tfidf = tfidf
+    print(f"Loaded recommender artifact {meta['build_id']} ({n} movies)")
+    return recommender
+
+
+def prune_builds(root: str = ARTIFACT_DIR, keep: int = 2):
+    """Delete all but the newest ``keep`` builds (the CURRENT one is always kept)."""
+    current = current_build(root)
+    builds = sorted((d for d in os.listdir(root)
+                     if not d.startswith(".") and os.path.isdir(os.path.join(root, d))),
+                    key=lambda d: os.path.getmtime(os.path.join(root, d)))
+    for build_id in builds[:-keep] if keep else builds:
+        path = os.path.join(root, build_id)
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)